@@ -0,0 +1,237 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from utils import normalize_question
+
+# Numbers, quoted phrases and capitalized words: the parts of a question that
+# name what it is about ("class A", "2023", "'Paris'").
+ENTITY_PATTERN = re.compile(
+    r"\"[^\"]+\"|(?<!\w)'[^']+'(?!\w)|\d+(?:[.,]\d+)*|\b[A-Z][\w-]*"
+)
+# Pronouns and openers that refer back to the conversation ("what about its
+# price?", "and in 2023?"); such questions only make sense with their history.
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\s*(?:and|also|what about|how about)\b"
+    r"|\b(?:it|its|they|them|their|this|that|these|those|he|him|his|she|her|"
+    r"above|previous|same|former|latter)\b",
+    re.IGNORECASE,
+)
+
+
+def question_entities(question):
+    """
+    Lowercased numbers, quoted phrases and capitalized words of a question.
+    The first word and "I" are skipped, being capitalized by grammar only.
+    """
+    question = question.strip()
+    entities = set()
+    for match in ENTITY_PATTERN.finditer(question):
+        token = match.group()
+        if token[0].isupper() and (match.start() == 0 or token == "I"):
+            continue
+        entities.add(token.strip("\"'").lower())
+    return frozenset(entities)
+
+
+def is_follow_up(question):
+    """Whether a question refers back to the conversation before it."""
+    return FOLLOW_UP_PATTERN.search(question) is not None
+
+
+class SemanticAnswerCache:
+    """
+    In-process cache of final answers keyed by the question's meaning.
+
+    A question is normalized (lowercased, whitespace collapsed, trailing
+    punctuation dropped). An identical normalized question is answered without
+    any model call. Otherwise its embedding is compared with the cached
+    questions of the same scope; the best match at or above threshold (cosine
+    similarity) is returned only if both questions name the same numbers,
+    quoted phrases and capitalized words, so "class A" never answers "class B".
+
+    Answers are shared by default: a question is keyed by its normalized text
+    alone, the corpus version being checked separately. Follow-up questions
+    (pronouns or openers like "what about" that refer back to the
+    conversation) are scoped to the conversation context they were answered
+    in, a hash of the rendered chat history, so they are never answered from
+    another conversation. With per_session, every answer is also scoped to
+    its chat session.
+
+    version is called on every lookup and store; when its value changes
+    (re-ingestion, a rewritten .db file) the whole cache is dropped, and an
+    answer is only stored if the version has not changed since its lookup.
+    Entries expire after ttl seconds and the least recently used are evicted
+    beyond max_entries.
+    """
+
+    def __init__(
+        self,
+        embedding_model,
+        version=None,
+        threshold=0.95,
+        max_entries=1024,
+        ttl=3600,
+        per_session=False,
+    ):
+        """
+        Args:
+            embedding_model: Embeddings used to embed the questions
+            version (callable): Returns a hashable corpus version, None for a fixed corpus
+            threshold (float): Minimum cosine similarity of a cache hit
+            max_entries (int): Maximum cached answers
+            ttl (float): Seconds an answer stays valid
+            per_session (bool): Only reuse answers given in the same chat session
+        """
+        self.__embedding_model = embedding_model
+        self.__version = version or (lambda: None)
+        self.__threshold = threshold
+        self.__max_entries = max_entries
+        self.__ttl = ttl
+        self.__per_session = per_session
+        self.__lock = threading.Lock()
+        self.__current_version = self.__version()
+        # key -> (scope, unit vector, entities, answer, created)
+        self.__entries = OrderedDict()
+        # key -> (unit vector, corpus version) of questions that missed, kept
+        # until their answer is stored.
+        self.__pending = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+
+    def lookup(self, question, session_id=None, context=""):
+        """
+        Args:
+            question (str): User question
+            session_id (str): Chat session of the question
+            context (str): Conversation context of follow-up questions (rendered history)
+
+        Returns:
+            str: Cached answer, None on a miss
+        """
+        key = self.__key(question, session_id, context)
+        found, answer, version = self.__find_exact(key)
+        if found:
+            return answer
+        vector = self.__unit(self.__embedding_model.embed_query(key[2]))
+        return self.__find_similar(key, vector, question_entities(question), version)
+
+    async def alookup(self, question, session_id=None, context=""):
+        """Async variant of lookup()."""
+        key = self.__key(question, session_id, context)
+        found, answer, version = self.__find_exact(key)
+        if found:
+            return answer
+        vector = self.__unit(await self.__embedding_model.aembed_query(key[2]))
+        return self.__find_similar(key, vector, question_entities(question), version)
+
+    def store(self, question, answer, session_id=None, context=""):
+        """
+        Cache the answer of a question that missed in lookup() with the same
+        arguments. Nothing is stored without that lookup, or when the corpus
+        version changed since it.
+
+        Args:
+            question (str): User question
+            answer (str): Final answer to cache
+            session_id (str): Chat session of the question
+            context (str): Conversation context passed to lookup()
+        """
+        key = self.__key(question, session_id, context)
+        with self.__lock:
+            pending = self.__pending.pop(key, None)
+            self.__check_version()
+            if pending is None or pending[1] != self.__current_version:
+                return
+            self.__entries[key] = (
+                key[:2],
+                pending[0],
+                question_entities(question),
+                answer,
+                time.monotonic(),
+            )
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__pending.clear()
+
+    def __key(self, question, session_id, context):
+        context_hash = (
+            hashlib.sha256(context.encode("utf-8")).hexdigest()
+            if is_follow_up(question)
+            else None
+        )
+        return (
+            session_id if self.__per_session else None,
+            context_hash,
+            normalize_question(question),
+        )
+
+    @staticmethod
+    def __unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def __check_version(self):
+        """Drop every entry once the corpus version changes. Call with the lock held."""
+        version = self.__version()
+        if version != self.__current_version:
+            print("---corpus changed, clearing the answer cache---")
+            self.__entries.clear()
+            self.__pending.clear()
+            self.__current_version = version
+
+    def __expire(self):
+        """Drop expired entries. Call with the lock held."""
+        deadline = time.monotonic() - self.__ttl
+        for key in [key for key, entry in self.__entries.items() if entry[4] < deadline]:
+            del self.__entries[key]
+
+    def __find_exact(self, key):
+        """
+        Returns:
+            tuple: (found, answer, corpus version the lookup ran against)
+        """
+        with self.__lock:
+            self.__check_version()
+            self.__expire()
+            version = self.__current_version
+            entry = self.__entries.get(key)
+            if entry is None:
+                return False, None, version
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+        print(f"---answer cache hit (exact), {self.__hits} hits / {self.__misses} misses---")
+        return True, entry[3], version
+
+    def __find_similar(self, key, vector, entities, version):
+        with self.__lock:
+            candidates = [
+                (cached_key, entry)
+                for cached_key, entry in self.__entries.items()
+                if entry[0] == key[:2] and entry[2] == entities
+            ]
+            if candidates:
+                similarities = np.stack([entry[1] for _, entry in candidates]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.__threshold:
+                    cached_key, entry = candidates[best]
+                    self.__entries.move_to_end(cached_key)
+                    self.__hits += 1
+                    print(
+                        f"---answer cache hit ({similarities[best]:.3f}), "
+                        f"{self.__hits} hits / {self.__misses} misses---"
+                    )
+                    return entry[3]
+            self.__misses += 1
+            self.__pending[key] = (vector, version)
+            while len(self.__pending) > self.__max_entries:
+                self.__pending.popitem(last=False)
+        return None
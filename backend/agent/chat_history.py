@@ -1,7 +1,11 @@
 from langchain_mongodb.chat_message_histories import MongoDBChatMessageHistory
 import logging
-from pymongo import errors
-from typing import List
+import threading
+from collections import OrderedDict, deque
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, MongoClient, errors
+from typing import List, Sequence
 from langchain_core.messages import (
     BaseMessage,
     message_to_dict,
@@ -11,51 +15,413 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-class CustomMongoDBChatMessageHistory(MongoDBChatMessageHistory):
-    @property
-    def messages(self) -> List[BaseMessage]:  # type: ignore
-        """Retrieve the messages from MongoDB"""
+SESSION_ID_KEY = "SessionId"
+HISTORY_KEY = "History"
+DATE_KEY = f"{HISTORY_KEY}.date"
+
+
+class ChatHistoryStore:
+    """
+    Hands out the chat history of a session, resolved per request.
+
+    One pooled MongoClient (and one motor client for the async paths) is
+    shared by every history of the process, instead of a client per history.
+
+    Per turn cost does not grow with conversation length:
+        - reads use the (session id, date) compound index and only fetch
+          messages newer than the last one seen, merged into a small
+          per-session LRU cache of the most recent messages
+        - new messages go into the cache at once and are written to MongoDB
+          in batches by a background thread (write-behind); close() flushes
+          what is still pending
+
+    The running summary of each session's older messages (see
+    HistoryCompactor) is stored next to the history in a
+    "<collection>_summaries" collection.
+    """
+
+    def __init__(
+        self,
+        connection_string,
+        database_name,
+        collection_name,
+        max_pool_size=100,
+        history_size=None,
+        cache_sessions=1024,
+        flush_interval=0.5,
+        flush_batch_size=100,
+    ):
+        """
+        Args:
+            connection_string (str): MongoDB connection string
+            database_name (str): Database holding the chat histories
+            collection_name (str): Collection holding the chat histories
+            max_pool_size (int): Maximum connections of each client's pool
+            history_size (int): Messages read per turn, None reads the latest 6
+            cache_sessions (int): Sessions kept in the in-process LRU cache
+            flush_interval (float): Seconds between write-behind flushes
+            flush_batch_size (int): Pending messages that trigger an early flush
+        """
+        self.__connection_string = connection_string
+        self.__database_name = database_name
+        self.__collection_name = collection_name
+        self.__max_pool_size = max_pool_size
+        self.__window = history_size or 6
+        self.__cache_sessions = cache_sessions
+        self.__flush_interval = flush_interval
+        self.__flush_batch_size = flush_batch_size
+        self.__client = MongoClient(connection_string, maxPoolSize=max_pool_size)
+        self.__collection = self.__client[database_name][collection_name]
+        self.__summaries = self.__client[database_name][f"{collection_name}_summaries"]
+        self.__async_client = None
+        self.__lock = threading.Lock()
+        self.__sessions = OrderedDict()
+        self.__pending = []
+        self.__flush_requested = threading.Event()
+        self.__closed = False
+        self.__flusher = None
         try:
-            if self.history_size is None:
-                cursor = (
-                    self.collection.find({self.session_id_key: self.session_id})
-                    .sort("History.date", -1)
-                    .limit(6)
-                )
-            else:
-                skip_count = max(
-                    0,
-                    self.collection.count_documents(
-                        {self.session_id_key: self.session_id}
-                    )
-                    - self.history_size,
-                )
-                cursor = self.collection.find(
-                    {self.session_id_key: self.session_id}, skip=skip_count
+            self.__collection.create_index(
+                [(SESSION_ID_KEY, ASCENDING), (DATE_KEY, DESCENDING)]
+            )
+            self.__summaries.create_index(SESSION_ID_KEY, unique=True)
+        except errors.PyMongoError as error:
+            logger.error(error)
+
+    @property
+    def collection(self):
+        return self.__collection
+
+    @property
+    def window(self):
+        """Number of most recent messages read verbatim per turn."""
+        return self.__window
+
+    @property
+    def async_collection(self):
+        return self.__async_database()[self.__collection_name]
+
+    def __async_database(self):
+        # Created on first use so the motor client binds to the running loop.
+        with self.__lock:
+            if self.__async_client is None:
+                self.__async_client = AsyncIOMotorClient(
+                    self.__connection_string, maxPoolSize=self.__max_pool_size
                 )
-        except errors.OperationFailure as error:
+        return self.__async_client[self.__database_name]
+
+    def get_history(self, session_id):
+        """
+        Args:
+            session_id (str): Conversation the request belongs to
+
+        Returns:
+            CustomMongoDBChatMessageHistory: History of that session only
+        """
+        return CustomMongoDBChatMessageHistory(
+            session_id, self, history_size=self.__window
+        )
+
+    def read(self, session_id):
+        """
+        Returns:
+            list: Latest history documents of the session, oldest first
+        """
+        cached, query, pending = self.__begin_read(session_id)
+        try:
+            documents = list(
+                self.__collection.find(query)
+                .sort(DATE_KEY, DESCENDING)
+                .limit(self.__window)
+            )
+        except errors.PyMongoError as error:
             logger.error(error)
+            documents = []
+        return self.__finish_read(session_id, cached, documents, pending)
 
-        if cursor:
-            items = [document[self.history_key] for document in cursor]
-        else:
-            items = []
+    async def aread(self, session_id):
+        """Async variant of read()."""
+        cached, query, pending = self.__begin_read(session_id)
+        try:
+            documents = (
+                await self.async_collection.find(query)
+                .sort(DATE_KEY, DESCENDING)
+                .limit(self.__window)
+                .to_list(self.__window)
+            )
+        except errors.PyMongoError as error:
+            logger.error(error)
+            documents = []
+        return self.__finish_read(session_id, cached, documents, pending)
 
-        items.reverse()
-        messages = messages_from_dict(items)
-        return messages
+    def read_since(self, session_id, after=None, limit=200):
+        """
+        Args:
+            session_id (str): Conversation to read
+            after (datetime): Only messages newer than this, None for all
+            limit (int): Maximum messages returned, the oldest ones after `after`
 
-    def add_message(self, message: BaseMessage) -> None:
-        """Append the message to the record in MongoDB"""
+        Returns:
+            list: History documents of the session, oldest first
+
+        Unlike read(), database errors are raised: a caller paging forward
+        must not mistake a failed read for the end of the history.
+        """
+        query, pending = self.__since(session_id, after)
+        documents = list(
+            self.__collection.find(query).sort(DATE_KEY, ASCENDING).limit(limit)
+        )
+        return self.__merge(documents, pending)[:limit]
+
+    async def aread_since(self, session_id, after=None, limit=200):
+        """Async variant of read_since()."""
+        query, pending = self.__since(session_id, after)
+        documents = (
+            await self.async_collection.find(query)
+            .sort(DATE_KEY, ASCENDING)
+            .limit(limit)
+            .to_list(limit)
+        )
+        return self.__merge(documents, pending)[:limit]
+
+    def get_summary(self, session_id):
+        """
+        Returns:
+            dict: Summary document (summary, covered_until) of the session, or None
+        """
+        try:
+            return self.__summaries.find_one({SESSION_ID_KEY: session_id})
+        except errors.PyMongoError as error:
+            logger.error(error)
+            return None
 
-        dict_message = message_to_dict(message)
-        dict_message["date"] = datetime.now()
+    async def aget_summary(self, session_id):
+        """Async variant of get_summary()."""
         try:
-            self.collection.insert_one(
-                {
-                    self.session_id_key: self.session_id,
-                    self.history_key: dict_message,
-                }
+            return await self.__async_database()[self.__summaries.name].find_one(
+                {SESSION_ID_KEY: session_id}
             )
-        except errors.WriteError as err:
-            logger.error(err)
+        except errors.PyMongoError as error:
+            logger.error(error)
+            return None
+
+    def save_summary(self, session_id, summary, covered_until):
+        """
+        Args:
+            session_id (str): Conversation the summary belongs to
+            summary (str): Running summary of the older messages
+            covered_until (datetime): Date of the last message folded into it
+        """
+        self.__summaries.update_one(
+            {SESSION_ID_KEY: session_id},
+            {"$set": self.__summary_fields(summary, covered_until)},
+            upsert=True,
+        )
+
+    async def asave_summary(self, session_id, summary, covered_until):
+        """Async variant of save_summary()."""
+        await self.__async_database()[self.__summaries.name].update_one(
+            {SESSION_ID_KEY: session_id},
+            {"$set": self.__summary_fields(summary, covered_until)},
+            upsert=True,
+        )
+
+    @staticmethod
+    def __summary_fields(summary, covered_until):
+        return {
+            "summary": summary,
+            "covered_until": covered_until,
+            "updated": datetime.now(),
+        }
+
+    def append(self, session_id, messages):
+        """
+        Add messages to the session's cache and queue them for writing.
+
+        Args:
+            session_id (str): Conversation the messages belong to
+            messages (list): Messages to append
+        """
+        documents = []
+        for message in messages:
+            dict_message = message_to_dict(message)
+            dict_message["date"] = datetime.now()
+            documents.append(
+                {"_id": ObjectId(), SESSION_ID_KEY: session_id, HISTORY_KEY: dict_message}
+            )
+        if not documents:
+            return
+        with self.__lock:
+            if self.__closed:
+                raise RuntimeError("Chat history store is closed")
+            cached = self.__sessions.get(session_id)
+            if cached is not None:
+                cached.extend(documents)
+            self.__pending.extend(documents)
+            if self.__flusher is None:
+                self.__flusher = threading.Thread(
+                    target=self.__flush_loop, name="chat-history-flush", daemon=True
+                )
+                self.__flusher.start()
+            if len(self.__pending) >= self.__flush_batch_size:
+                self.__flush_requested.set()
+
+    def clear(self, session_id):
+        """Delete every message of a session, including unflushed ones."""
+        with self.__lock:
+            self.__sessions.pop(session_id, None)
+            self.__pending = [
+                document
+                for document in self.__pending
+                if document[SESSION_ID_KEY] != session_id
+            ]
+        self.__collection.delete_many({SESSION_ID_KEY: session_id})
+        self.__summaries.delete_one({SESSION_ID_KEY: session_id})
+
+    def flush(self):
+        """Write every pending message to MongoDB now."""
+        with self.__lock:
+            batch, self.__pending = self.__pending, []
+        if not batch:
+            return
+        try:
+            self.__collection.insert_many(batch, ordered=False)
+        except errors.BulkWriteError as error:
+            # The rest of the batch was written; retrying would only hit duplicates.
+            logger.error(error.details.get("writeErrors"))
+        except errors.PyMongoError as error:
+            logger.error(error)
+            with self.__lock:
+                self.__pending = batch + self.__pending
+
+    def close(self):
+        """Flush pending messages and close the clients, e.g. on shutdown."""
+        with self.__lock:
+            self.__closed = True
+            flusher = self.__flusher
+        self.__flush_requested.set()
+        if flusher is not None:
+            flusher.join()
+        self.flush()
+        self.__client.close()
+        if self.__async_client is not None:
+            self.__async_client.close()
+
+    def __flush_loop(self):
+        while True:
+            self.__flush_requested.wait(self.__flush_interval)
+            self.__flush_requested.clear()
+            self.flush()
+            with self.__lock:
+                if self.__closed:
+                    return
+
+    def __begin_read(self, session_id):
+        """
+        Returns:
+            tuple: (cached documents or None, MongoDB query, pending documents)
+        """
+        with self.__lock:
+            cached = self.__sessions.get(session_id)
+            if cached is not None:
+                self.__sessions.move_to_end(session_id)
+                cached = list(cached)
+            # Taken before querying so messages flushed meanwhile are deduplicated by _id.
+            pending = [
+                document
+                for document in self.__pending
+                if document[SESSION_ID_KEY] == session_id
+            ]
+        query = {SESSION_ID_KEY: session_id}
+        if cached:
+            # Only messages other workers wrote since the last one we have.
+            query[DATE_KEY] = {"$gt": cached[-1][HISTORY_KEY]["date"]}
+        return cached, query, pending
+
+    def __since(self, session_id, after):
+        query = {SESSION_ID_KEY: session_id}
+        if after is not None:
+            query[DATE_KEY] = {"$gt": after}
+        with self.__lock:
+            pending = [
+                document
+                for document in self.__pending
+                if document[SESSION_ID_KEY] == session_id
+                and (after is None or document[HISTORY_KEY]["date"] > after)
+            ]
+        return query, pending
+
+    @staticmethod
+    def __merge(*groups):
+        """Deduplicate history documents by _id and order them oldest first."""
+        merged = {}
+        for group in groups:
+            for document in group:
+                merged[document["_id"]] = document
+        return sorted(
+            merged.values(), key=lambda document: document[HISTORY_KEY]["date"]
+        )
+
+    def __finish_read(self, session_id, cached, documents, pending):
+        latest = self.__merge(cached or [], documents, pending)[-self.__window :]
+        with self.__lock:
+            self.__sessions[session_id] = deque(latest, maxlen=self.__window)
+            self.__sessions.move_to_end(session_id)
+            while len(self.__sessions) > self.__cache_sessions:
+                self.__sessions.popitem(last=False)
+        return latest
+
+
+class CustomMongoDBChatMessageHistory(MongoDBChatMessageHistory):
+    """
+    MongoDB chat history reading the most recent messages of a session.
+
+    Reads and writes go through the ChatHistoryStore cache and write-behind
+    queue; the async read uses motor, so graph nodes awaiting the history
+    never block the event loop.
+    """
+
+    def __init__(self, session_id, store, history_size=None):
+        """
+        Args:
+            session_id (str): Conversation whose messages are read and written
+            store (ChatHistoryStore): Provides the shared Mongo collections
+            history_size (int): Messages read per turn
+        """
+        # The parent would open a MongoClient per history; bind to the store's
+        # pooled collection instead.
+        self.session_id = session_id
+        self.session_id_key = SESSION_ID_KEY
+        self.history_key = HISTORY_KEY
+        self.history_size = history_size
+        self.collection = store.collection
+        self.db = self.collection.database
+        self.client = self.db.client
+        self.database_name = self.db.name
+        self.collection_name = self.collection.name
+        self.__store = store
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore
+        """Retrieve the latest messages of the session"""
+        documents = self.__store.read(self.session_id)
+        return messages_from_dict([document[self.history_key] for document in documents])
+
+    def add_message(self, message: BaseMessage) -> None:
+        """Append the message; it is written to MongoDB in the background"""
+        self.__store.append(self.session_id, [message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.__store.append(self.session_id, messages)
+
+    def clear(self) -> None:
+        self.__store.clear(self.session_id)
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        """Retrieve the latest messages without blocking the event loop"""
+        documents = await self.__store.aread(self.session_id)
+        return messages_from_dict([document[self.history_key] for document in documents])
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """Append the messages; only queues them, so it never blocks"""
+        self.__store.append(self.session_id, messages)
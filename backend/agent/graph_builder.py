@@ -1,10 +1,11 @@
 from langgraph.graph import StateGraph, END, START
 from langchain_core.tools.base import BaseTool
+from langchain_core.runnables import RunnableLambda
 from typing import List
 from agent.nodes import QueryProcessingNodes
 from agent.tool_node import ToolNode
-from agent.state import ProcessState, InputState, OutputState
-import uuid
+from agent.history_compactor import HistoryCompactor
+from agent.state import ProcessState, InputState, OutputState, ConfigSchema
 
 
 class GraphBuilder:
@@ -13,7 +14,16 @@ class GraphBuilder:
     """
 
     def __init__(
-        self, model_with_tool, chain_multimodal_rag, llm, tools: List[BaseTool]
+        self,
+        model_with_tool,
+        chain_multimodal_rag,
+        llm,
+        tools: List[BaseTool],
+        history_store,
+        tool_max_concurrency=4,
+        tool_timeout=None,
+        history_compactor=None,
+        answer_cache=None,
     ):
         """
         Initialize with required models, chains and tools.
@@ -23,11 +33,26 @@ class GraphBuilder:
             chain_multimodal_rag: RAG chain for vector store lookup
             llm: LLM for final response generation
             tools: List of tools available for queries
+            history_store: ChatHistoryStore resolving each session's history
+            tool_max_concurrency: Tool calls running at once
+            tool_timeout: Seconds a single tool call may run, None for no limit
+            history_compactor: HistoryCompactor for the prompt history, by default
+                one summarizing with llm
+            answer_cache: SemanticAnswerCache answering repeated questions, None to disable
         """
         self.tools = tools
+        self.tool_node = ToolNode(
+            tools, max_concurrency=tool_max_concurrency, timeout=tool_timeout
+        )
         self.nodes = QueryProcessingNodes(
-            model_with_tool, chain_multimodal_rag, llm, str(uuid.uuid4())
+            model_with_tool,
+            chain_multimodal_rag,
+            llm,
+            history_store,
+            history_compactor or HistoryCompactor(llm, history_store),
+            answer_cache,
         )
+        self.answer_cache = answer_cache
 
     def build(self):
         """
@@ -36,21 +61,75 @@ class GraphBuilder:
         Returns:
             Compiled StateGraph
         """
-        builder = StateGraph(ProcessState, input=InputState, output=OutputState)
+        # The session id arrives per request in config["configurable"]["session_id"].
+        builder = StateGraph(
+            ProcessState,
+            config_schema=ConfigSchema,
+            input=InputState,
+            output=OutputState,
+        )
 
         # Add nodes
-        builder.add_node("assistant", self.nodes.determine_tool_call)
-        builder.add_node("tools", ToolNode(self.tools))
-        builder.add_node("finalize_response", self.nodes.finalize_response)
-        builder.add_node("search_vectorstore", self.nodes.search_vectorstore)
-        builder.add_node("retrieve_history", self.nodes.retrieve_history)
+        # Each node pairs its sync and async variant so ainvoke/astream_events
+        # (used by LangServe) never run blocking node code on the event loop.
+        builder.add_node(
+            "assistant",
+            RunnableLambda(
+                self.nodes.determine_tool_call, afunc=self.nodes.adetermine_tool_call
+            ),
+        )
+        builder.add_node(
+            "tools", RunnableLambda(self.tool_node, afunc=self.tool_node.acall)
+        )
+        builder.add_node(
+            "finalize_response",
+            RunnableLambda(
+                self.nodes.finalize_response, afunc=self.nodes.afinalize_response
+            ),
+        )
+        builder.add_node(
+            "search_vectorstore",
+            RunnableLambda(
+                self.nodes.search_vectorstore, afunc=self.nodes.asearch_vectorstore
+            ),
+        )
+        builder.add_node(
+            "retrieve_history",
+            RunnableLambda(
+                self.nodes.retrieve_history, afunc=self.nodes.aretrieve_history
+            ),
+        )
 
         # Add edges
+        # The RAG lookup does not depend on the tool calls, so it fans out from
+        # retrieve_history and runs alongside assistant -> tools; finalize_response
+        # waits for both branches.
         builder.add_edge(START, "retrieve_history")
-        builder.add_edge("retrieve_history", "assistant")
-        builder.add_conditional_edges("assistant", self.nodes.router)
-        builder.add_edge("tools", "search_vectorstore")
-        builder.add_edge("search_vectorstore", "finalize_response")
+        if self.answer_cache is None:
+            builder.add_edge("retrieve_history", "assistant")
+            builder.add_edge("retrieve_history", "search_vectorstore")
+        else:
+            # The cache is keyed on the rendered history, so it is checked once
+            # that is loaded; hits end the run before any LLM call.
+            builder.add_node(
+                "lookup_answer_cache",
+                RunnableLambda(
+                    self.nodes.lookup_answer_cache,
+                    afunc=self.nodes.alookup_answer_cache,
+                ),
+            )
+            builder.add_edge("retrieve_history", "lookup_answer_cache")
+            builder.add_conditional_edges(
+                "lookup_answer_cache",
+                lambda state: (
+                    END
+                    if state.get("answer_cached")
+                    else ["assistant", "search_vectorstore"]
+                ),
+                [END, "assistant", "search_vectorstore"],
+            )
+        builder.add_edge("assistant", "tools")
+        builder.add_edge(["tools", "search_vectorstore"], "finalize_response")
         builder.add_edge("finalize_response", END)
 
         # Compile and return
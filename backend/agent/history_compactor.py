@@ -0,0 +1,200 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import tiktoken
+from langchain_core.messages import messages_from_dict
+from langchain_core.output_parsers import StrOutputParser
+from agent.chat_history import HISTORY_KEY
+from agent.prompts import QueryPrompts
+
+
+class HistoryCompactor:
+    """
+    Keeps the chat history sent to the LLMs at a flat size per turn.
+
+    The prompt history is the session's running summary followed by the most
+    recent messages verbatim (the history store's window), trimmed to
+    max_tokens: the oldest verbatim messages are dropped first, and a summary
+    that alone exceeds half the budget is truncated.
+
+    After each response the messages that slid out of the verbatim window are
+    folded into the running summary by the LLM, in the background, and the
+    summary is saved next to the history in MongoDB. An update pages forward
+    from the last summarized message, oldest first, folding at most
+    fold_batch_size messages per LLM call, so a long unsummarized backlog is
+    folded completely. Only one update runs per session at a time; messages
+    an update skips are folded by the next one.
+    """
+
+    def __init__(
+        self,
+        llm,
+        history_store,
+        max_tokens=1500,
+        fold_batch_size=50,
+        encoding_name="cl100k_base",
+    ):
+        """
+        Args:
+            llm: LLM that writes the running summary
+            history_store: ChatHistoryStore holding the history and summaries
+            max_tokens (int): Token budget of the history put into a prompt
+            fold_batch_size (int): Messages folded into the summary per LLM call
+            encoding_name (str): tiktoken encoding used to count tokens
+        """
+        self.__chain = QueryPrompts.get_summary_update_prompt() | llm | StrOutputParser()
+        self.__history_store = history_store
+        self.__max_tokens = max_tokens
+        self.__fold_batch_size = fold_batch_size
+        self.__encoding = tiktoken.get_encoding(encoding_name)
+        self.__updating = set()
+        self.__lock = threading.Lock()
+        self.__executor = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="history-summary"
+        )
+        # Keeps scheduled async updates referenced until they finish.
+        self.__tasks = set()
+
+    def render(self, summary, messages):
+        """
+        Args:
+            summary (dict): Summary document of the session, or None
+            messages (list): Most recent messages, oldest first
+
+        Returns:
+            str: Summary and recent messages within the token budget
+        """
+        sections = []
+        remaining = self.__max_tokens
+        if summary and summary.get("summary"):
+            tokens = self.__encoding.encode(summary["summary"])[: self.__max_tokens // 2]
+            sections.append(
+                "Summary of the earlier conversation:\n" + self.__encoding.decode(tokens)
+            )
+            remaining -= len(tokens)
+
+        lines = []
+        for message in reversed(messages):
+            line = self.__format_message(message)
+            tokens = len(self.__encoding.encode(line))
+            if tokens > remaining:
+                break
+            lines.insert(0, line)
+            remaining -= tokens
+        if lines:
+            sections.append("Recent messages:\n" + "\n".join(lines))
+        return "\n\n".join(sections) or "No previous conversation."
+
+    def schedule_update(self, session_id):
+        """Fold messages that left the verbatim window into the summary, in a worker thread."""
+        if self.__claim(session_id):
+            self.__executor.submit(self.__run_update, session_id)
+
+    def aschedule_update(self, session_id):
+        """Async variant of schedule_update(); runs as a task on the current loop."""
+        if self.__claim(session_id):
+            task = asyncio.get_running_loop().create_task(self.__arun_update(session_id))
+            self.__tasks.add(task)
+            task.add_done_callback(self.__tasks.discard)
+
+    def close(self):
+        self.__executor.shutdown(wait=True)
+
+    async def aclose(self, timeout=10):
+        """
+        Wait up to timeout seconds for running summary updates, cancel the
+        rest, then shut down the worker threads. Run before the history
+        store is closed.
+        """
+        tasks = list(self.__tasks)
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await asyncio.to_thread(self.close)
+
+    def __claim(self, session_id):
+        with self.__lock:
+            if session_id in self.__updating:
+                return False
+            self.__updating.add(session_id)
+            return True
+
+    def __release(self, session_id):
+        with self.__lock:
+            self.__updating.discard(session_id)
+
+    def __run_update(self, session_id):
+        try:
+            summary = self.__history_store.get_summary(session_id)
+            while True:
+                folded = self.__to_fold(
+                    self.__history_store.read_since(
+                        session_id, self.__covered_until(summary), self.__page_size()
+                    )
+                )
+                if not folded:
+                    return
+                text = self.__chain.invoke(self.__prompt_input(summary, folded))
+                summary = self.__folded_summary(text, folded)
+                self.__history_store.save_summary(
+                    session_id, text, summary["covered_until"]
+                )
+                print(f"---summarized {len(folded)} messages of session {session_id}---")
+        except Exception as e:
+            print(f"Error updating conversation summary: {e}")
+        finally:
+            self.__release(session_id)
+
+    async def __arun_update(self, session_id):
+        try:
+            summary = await self.__history_store.aget_summary(session_id)
+            while True:
+                folded = self.__to_fold(
+                    await self.__history_store.aread_since(
+                        session_id, self.__covered_until(summary), self.__page_size()
+                    )
+                )
+                if not folded:
+                    return
+                text = await self.__chain.ainvoke(self.__prompt_input(summary, folded))
+                summary = self.__folded_summary(text, folded)
+                await self.__history_store.asave_summary(
+                    session_id, text, summary["covered_until"]
+                )
+                print(f"---summarized {len(folded)} messages of session {session_id}---")
+        except Exception as e:
+            print(f"Error updating conversation summary: {e}")
+        finally:
+            self.__release(session_id)
+
+    @staticmethod
+    def __covered_until(summary):
+        return summary.get("covered_until") if summary else None
+
+    def __page_size(self):
+        # The last window messages of a page are held back: they may be the
+        # verbatim ones, or are folded with the next page.
+        return self.__fold_batch_size + self.__history_store.window
+
+    @staticmethod
+    def __folded_summary(text, folded):
+        return {"summary": text, "covered_until": folded[-1][HISTORY_KEY]["date"]}
+
+    def __to_fold(self, documents):
+        """Unsummarized documents older than the verbatim window."""
+        window = self.__history_store.window
+        return documents[:-window] if len(documents) > window else []
+
+    def __prompt_input(self, summary, documents):
+        messages = messages_from_dict([document[HISTORY_KEY] for document in documents])
+        return {
+            "summary": (summary or {}).get("summary") or "None yet.",
+            "new_lines": "\n".join(self.__format_message(message) for message in messages),
+        }
+
+    @staticmethod
+    def __format_message(message):
+        role = "User" if message.type == "human" else "Assistant"
+        return f"{role}: {message.content}"
@@ -1,17 +1,37 @@
-from typing import Literal
-from langchain_core.messages import ToolMessage
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 from agent.prompts import QueryPrompts
 from agent.state import ProcessState,InputState,OutputState
-from langchain_core.runnables import RunnablePassthrough
-from agent.chat_history import CustomMongoDBChatMessageHistory
+from langchain_core.runnables import RunnablePassthrough, RunnableConfig
+from agent.progress import report_progress, areport_progress, FINAL_ANSWER_TAG
+import asyncio
 import uuid
 
 class QueryProcessingNodes:
     """
     Collection of node functions for the query processing graph.
+
+    Every node has an async variant (prefixed with "a") that awaits the LLMs,
+    the RAG chain and the chat history, used when the graph runs on the event
+    loop (ainvoke/astream_events, as LangServe does).
+
+    The chat history reaches the prompts compacted by the HistoryCompactor:
+    a running summary plus the most recent messages, rendered once per turn
+    into state["chat_history"].
+
+    With an answer cache, lookup_answer_cache runs right after retrieve_history
+    and answers repeated questions without any LLM call (follow-up questions
+    only within the same conversation context); finalize_response stores new answers.
     """
 
-    def __init__(self, model_with_tool, chain_multimodal_rag, llm,storage_id):
+    def __init__(
+        self,
+        model_with_tool,
+        chain_multimodal_rag,
+        llm,
+        history_store,
+        history_compactor,
+        answer_cache=None,
+    ):
         """
         Initialize with required models and chains.
 
@@ -19,24 +39,89 @@ class QueryProcessingNodes:
             model_with_tool: LLM with tool-using capabilities
             chain_multimodal_rag: RAG chain for vector store lookup
             llm: LLM for final response generation
+            history_store: ChatHistoryStore resolving the history of each request's session
+            history_compactor: HistoryCompactor rendering and summarizing the history
+            answer_cache: SemanticAnswerCache of final answers, None to disable
         """
         self.model_with_tool = model_with_tool
         self.chain_multimodal_rag = chain_multimodal_rag
         self.llm = llm
-        self.__chat_message_history = CustomMongoDBChatMessageHistory(
-            session_id=storage_id,
-            connection_string="mongodb://localhost:27017",
-            database_name="my_db",
-            collection_name="chat_histories",
+        self.__history_store = history_store
+        self.__history_compactor = history_compactor
+        self.__answer_cache = answer_cache
+
+    @staticmethod
+    def __session_id(config):
+        """Session in config["configurable"]["session_id"]."""
+        session_id = (config or {}).get("configurable", {}).get("session_id")
+        # Without a session the turn is answered without shared history.
+        return session_id or f"anonymous-{uuid.uuid4()}"
+
+    def lookup_answer_cache(self, state: ProcessState, config: RunnableConfig) -> ProcessState:
+        """
+        Answer the query from the answer cache if a similar question was answered.
+
+        Args:
+            state: Current graph state, with the rendered chat history
+
+        Returns:
+            answer_cached flag, and the answer on a hit
+        """
+        print("---checking answer cache---")
+        session_id = self.__session_id(config)
+        answer = self.__answer_cache.lookup(
+            state["user_query"].content, session_id, state["chat_history"]
+        )
+        if answer is None:
+            return {"answer_cached": False}
+        # retrieve_history added the query; the answer completes the turn.
+        self.__history_store.get_history(session_id).add_ai_message(answer)
+        self.__history_compactor.schedule_update(session_id)
+        return {"answer_cached": True, "answer": AIMessage(content=answer)}
+
+    async def alookup_answer_cache(self, state: ProcessState, config: RunnableConfig) -> ProcessState:
+        """Async variant of lookup_answer_cache."""
+        print("---checking answer cache---")
+        session_id = self.__session_id(config)
+        answer = await self.__answer_cache.alookup(
+            state["user_query"].content, session_id, state["chat_history"]
+        )
+        if answer is None:
+            return {"answer_cached": False}
+        await self.__history_store.get_history(session_id).aadd_messages(
+            [AIMessage(content=answer)]
         )
+        self.__history_compactor.aschedule_update(session_id)
+        return {"answer_cached": True, "answer": AIMessage(content=answer)}
 
-    def retrieve_history(self,state:InputState) -> ProcessState:
+    def retrieve_history(self,state:InputState, config: RunnableConfig) -> ProcessState:
         print("---retrieving history---")
+        report_progress("retrieve_history", "Loading conversation history", config)
         user_query = state["user_query"]
-        self.__chat_message_history.add_user_message(user_query.content)
-        return {"messages": self.__chat_message_history.messages}
+        session_id = self.__session_id(config)
+        chat_message_history = self.__history_store.get_history(session_id)
+        # Read before adding the query, which the prompts already carry on its own.
+        summary = self.__history_store.get_summary(session_id)
+        messages = chat_message_history.messages
+        chat_message_history.add_user_message(user_query.content)
+        return {"chat_history": self.__history_compactor.render(summary, messages)}
+
+    async def aretrieve_history(self, state: InputState, config: RunnableConfig) -> ProcessState:
+        print("---retrieving history---")
+        await areport_progress("retrieve_history", "Loading conversation history", config)
+        user_query = state["user_query"]
+        session_id = self.__session_id(config)
+        chat_message_history = self.__history_store.get_history(session_id)
+        summary, messages = await asyncio.gather(
+            self.__history_store.aget_summary(session_id),
+            chat_message_history.aget_messages(),
+        )
+        await chat_message_history.aadd_messages(
+            [HumanMessage(content=user_query.content)]
+        )
+        return {"chat_history": self.__history_compactor.render(summary, messages)}
 
-    def determine_tool_call(self, state: ProcessState) -> ProcessState:
+    def determine_tool_call(self, state: ProcessState, config: RunnableConfig) -> ProcessState:
         """
         Analyze the user query to determine if a tool call is needed.
 
@@ -47,30 +132,28 @@ class QueryProcessingNodes:
             Updated state with analyzer's response
         """
         print("---determine_tool_call---")
-        messages = state["messages"]
-        tool_call_prompt = QueryPrompts.get_tool_analysis_prompt().format(
-            chat_history=messages, query=state["user_query"]
-        )
-        result = self.model_with_tool.invoke(tool_call_prompt)
+        report_progress("assistant", "Analyzing the question", config)
+        result = self.model_with_tool.invoke(self.__tool_call_prompt(state), config)
         print(result)
         return {"messages": [result]}
 
-    def router(self, state: ProcessState) -> Literal["tools", "search_vectorstore"]:
-        """
-        Routes the flow based on whether a tool call was initiated.
-
-        Args:
-            state: Current graph state
+    async def adetermine_tool_call(self, state: ProcessState, config: RunnableConfig) -> ProcessState:
+        """Async variant of determine_tool_call."""
+        print("---determine_tool_call---")
+        await areport_progress("assistant", "Analyzing the question", config)
+        result = await self.model_with_tool.ainvoke(
+            self.__tool_call_prompt(state), config
+        )
+        print(result)
+        return {"messages": [result]}
 
-        Returns:
-            Next node to route to
-        """
-        messages = state["messages"]
-        if messages[-1].tool_calls:
-            return "tools"
-        return "search_vectorstore"
+    @staticmethod
+    def __tool_call_prompt(state):
+        return QueryPrompts.get_tool_analysis_prompt().format(
+            chat_history=state["chat_history"], query=state["user_query"]
+        )
 
-    def search_vectorstore(self, state: ProcessState) -> ProcessState:
+    def search_vectorstore(self, state: ProcessState, config: RunnableConfig) -> ProcessState:
         """
         Searches the vector store for information related to the query.
 
@@ -81,15 +164,28 @@ class QueryProcessingNodes:
             Updated state with vector store results
         """
         print("---searching vectorstore---")
+        report_progress("search_vectorstore", "Searching documents", config)
         user_query = state["user_query"]
-        result = self.chain_multimodal_rag.invoke(user_query.content)
+        result = self.chain_multimodal_rag.invoke(user_query.content, config)
         print(result)
         return {"vectorstore_answer": ToolMessage(content=result,tool_call_id=str(uuid.uuid4()))}
 
-    def finalize_response(self, state: ProcessState) -> OutputState:
+    async def asearch_vectorstore(self, state: ProcessState, config: RunnableConfig) -> ProcessState:
+        """Async variant of search_vectorstore."""
+        print("---searching vectorstore---")
+        await areport_progress("search_vectorstore", "Searching documents", config)
+        user_query = state["user_query"]
+        result = await self.chain_multimodal_rag.ainvoke(user_query.content, config)
+        print(result)
+        return {"vectorstore_answer": ToolMessage(content=result,tool_call_id=str(uuid.uuid4()))}
+
+    def finalize_response(self, state: ProcessState, config: RunnableConfig) -> OutputState:
         """
         Generates the final response by integrating tool and vector store results.
 
+        The LLM run is tagged FINAL_ANSWER_TAG; with stream_events its tokens
+        are streamed to the client as they are generated.
+
         Args:
             state: Current graph state
 
@@ -97,22 +193,48 @@ class QueryProcessingNodes:
             Updated state with final response
         """
         print("---finalize_response---")
-        db_ans = ""
-        try:
-            db_ans = state["database_answer"]
-        except:
-            db_ans = ""
-        chain = (
+        report_progress("finalize_response", "Writing the answer", config)
+        final_response = self.__response_chain(state).invoke(state, config)
+        session_id = self.__session_id(config)
+        self.__history_store.get_history(session_id).add_ai_message(final_response.content)
+        self.__history_compactor.schedule_update(session_id)
+        self.__store_answer(state, final_response, session_id)
+        return {"answer": final_response}
+
+    async def afinalize_response(self, state: ProcessState, config: RunnableConfig) -> OutputState:
+        """Async variant of finalize_response."""
+        print("---finalize_response---")
+        await areport_progress("finalize_response", "Writing the answer", config)
+        final_response = await self.__response_chain(state).ainvoke(state, config)
+        session_id = self.__session_id(config)
+        await self.__history_store.get_history(session_id).aadd_messages(
+            [AIMessage(content=final_response.content)]
+        )
+        self.__history_compactor.aschedule_update(session_id)
+        self.__store_answer(state, final_response, session_id)
+        return {"answer": final_response}
+
+    def __store_answer(self, state, final_response, session_id):
+        # Answers built on a failed or timed out tool call are not reused.
+        if self.__answer_cache is None or state.get("tool_failed"):
+            return
+        self.__answer_cache.store(
+            state["user_query"].content,
+            final_response.content,
+            session_id,
+            state["chat_history"],
+        )
+
+    def __response_chain(self, state):
+        # Empty when the assistant decided no tool call was needed.
+        db_ans = state.get("database_answer") or ""
+        return (
             RunnablePassthrough().assign(
-                chat_history=lambda x: x["messages"],
+                chat_history=lambda x: x["chat_history"],
                 current_query=lambda x: x["user_query"],
                 first_answer=lambda x: db_ans,
                 second_answer=lambda x: x["vectorstore_answer"],
             )
             | QueryPrompts.get_response_integration_prompt()
-            | self.llm
+            | self.llm.with_config(tags=[FINAL_ANSWER_TAG])
         )
-
-        final_response = chain.invoke(state)
-        self.__chat_message_history.add_ai_message(final_response.content)
-        return {"answer": final_response}
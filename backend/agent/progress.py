@@ -0,0 +1,38 @@
+from langchain_core.callbacks.manager import (
+    adispatch_custom_event,
+    dispatch_custom_event,
+)
+
+PROGRESS_EVENT = "progress"
+# Tag of the LLM run that writes the final answer, so streaming clients can
+# tell its tokens apart from the tool analysis and RAG chain tokens.
+FINAL_ANSWER_TAG = "final_answer"
+
+
+def report_progress(node, message, config=None):
+    """
+    Emit a progress event for a graph node, surfaced to clients of the
+    LangServe stream_events endpoint as an on_custom_event named "progress".
+
+    Args:
+        node (str): Name of the graph node
+        message (str): Human readable status
+        config: RunnableConfig the node was invoked with
+    """
+    try:
+        dispatch_custom_event(
+            PROGRESS_EVENT, {"node": node, "message": message}, config=config
+        )
+    except RuntimeError:
+        # Invoked outside of a traced run (e.g. called directly), nobody listens.
+        pass
+
+
+async def areport_progress(node, message, config=None):
+    """Async variant of report_progress, for nodes running on the event loop."""
+    try:
+        await adispatch_custom_event(
+            PROGRESS_EVENT, {"node": node, "message": message}, config=config
+        )
+    except RuntimeError:
+        pass
@@ -98,6 +98,20 @@ class QueryPrompts:
 
     """
 
+    SUMMARY_UPDATE_TEMPLATE = """
+    Progressively summarize a conversation between a user and an assistant. Extend the current summary with the new lines and return only the new summary.
+
+    Keep every fact, figure, name and decision the user may refer back to, and what the user was asking about. Drop greetings and repetition. Write a few short paragraphs at most.
+
+    Current Summary:
+    {summary}
+
+    New Lines:
+    {new_lines}
+
+    New Summary:
+    """
+
     @classmethod
     def get_tool_analysis_prompt(cls):
         """Returns the formatted tool analysis prompt template."""
@@ -107,3 +121,8 @@ class QueryPrompts:
     def get_response_integration_prompt(cls):
         """Returns the formatted response integration prompt template."""
         return PromptTemplate.from_template(cls.RESPONSE_INTEGRATION_TEMPLATE)
+
+    @classmethod
+    def get_summary_update_prompt(cls):
+        """Returns the running conversation summary prompt template."""
+        return PromptTemplate.from_template(cls.SUMMARY_UPDATE_TEMPLATE)
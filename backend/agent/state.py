@@ -10,5 +10,11 @@ class OutputState(TypedDict):
 
 class ProcessState(InputState):
     messages: Annotated[List[AnyMessage],add_messages]
+    chat_history: str
     database_answer: List[ToolMessage]
     vectorstore_answer: ToolMessage
+    tool_failed: bool
+    answer_cached: bool
+
+class ConfigSchema(TypedDict):
+    session_id: str
@@ -1,34 +1,141 @@
+import asyncio
 import json
+from concurrent.futures import ThreadPoolExecutor, wait
 from agent.state import ProcessState
 from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from agent.progress import report_progress, areport_progress
+
+
+class ToolCallFailure(str):
+    """Content reported for a tool call that failed or timed out."""
 
 
 class ToolNode:
-    """A node that runs the tools requested in the last AIMessage."""
+    """
+    A node that runs the tools requested in the last AIMessage.
+
+    Independent tool calls (the analysis prompt splits compound questions into
+    one call per database) run concurrently on a bounded thread pool shared by
+    all requests. The calls of a turn get timeout seconds from submission,
+    time spent queued for a worker included, so timeout bounds the turn;
+    calls still queued at the deadline are cancelled. Failed or timed out
+    calls are reported in their ToolMessage instead of failing the whole
+    turn, and state["tool_failed"] is set so the answer is not cached.
+    Outputs keep the order of the tool calls.
 
-    def __init__(self, tools: list) -> None:
+    acall is the async variant: calls are awaited together, bounded by a
+    semaphore, with asyncio.wait_for enforcing the timeout over the wait for
+    the semaphore and the call.
+    """
+
+    def __init__(self, tools: list, max_concurrency=4, timeout=None) -> None:
+        """
+        Args:
+            tools (list): Tools the assistant can call
+            max_concurrency (int): Tool calls running at once across all requests
+            timeout (float): Seconds the calls of a turn may take, None waits indefinitely
+        """
         self.tools_by_name = {tool.name: tool for tool in tools}
+        self.__timeout = timeout
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max(1, max_concurrency), thread_name_prefix="tool-call"
+        )
+        self.__semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    def __call__(self, inputs: ProcessState, config: RunnableConfig) -> ProcessState:
+        tool_calls = self.__tool_calls(inputs)
+        futures = [
+            self.__executor.submit(self.__run_tool_call, tool_call, config)
+            for tool_call in tool_calls
+        ]
+        contents = self.__collect(futures)
+        return self.__to_state(tool_calls, contents)
 
-    def __call__(self, inputs: ProcessState) -> ProcessState:
+    async def acall(self, inputs: ProcessState, config: RunnableConfig) -> ProcessState:
+        tool_calls = self.__tool_calls(inputs)
+        contents = await asyncio.gather(
+            *(self.__arun_tool_call(tool_call, config) for tool_call in tool_calls)
+        )
+        return self.__to_state(tool_calls, contents)
 
+    def __tool_calls(self, inputs):
         if messages := inputs.get("messages", []):
             message = messages[-1]
         else:
             raise ValueError("No message found in input")
+        # The graph always passes through this node; no tool calls means no database answer.
+        return [
+            tool_call
+            for tool_call in getattr(message, "tool_calls", None) or []
+            if tool_call["name"] in self.tools_by_name
+        ]
+
+    @staticmethod
+    def __to_state(tool_calls, contents):
         outputs = []
-        for tool_call in message.tool_calls:
-            if tool_call["name"] not in self.tools_by_name:
-                continue
-            print(f"---calling {tool_call['name']}---")
-            tool_result = self.tools_by_name[tool_call["name"]].invoke(
-                tool_call["args"]["query"]
-            )
-            print(tool_result.content)
+        for tool_call, content in zip(tool_calls, contents):
+            print(content)
             outputs.append(
                 ToolMessage(
-                    content=json.dumps(tool_result.content),
+                    content=json.dumps(content),
                     name=tool_call["name"],
                     tool_call_id=tool_call["id"],
                 )
             )
-        return {"database_answer": outputs}
+        return {
+            "database_answer": outputs,
+            "tool_failed": any(isinstance(content, ToolCallFailure) for content in contents),
+        }
+
+    def __run_tool_call(self, tool_call, config):
+        print(f"---calling {tool_call['name']}---")
+        report_progress("tools", f"Querying {tool_call['name']}", config)
+        tool_result = self.tools_by_name[tool_call["name"]].invoke(
+            tool_call["args"]["query"], config
+        )
+        return tool_result.content
+
+    async def __arun_tool_call(self, tool_call, config):
+        try:
+            return await asyncio.wait_for(
+                self.__ainvoke_tool_call(tool_call, config), self.__timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"Tool call timed out after {self.__timeout}s")
+            return ToolCallFailure(f"Tool call timed out after {self.__timeout} seconds")
+        except Exception as e:
+            print(f"Tool call failed: {e}")
+            return ToolCallFailure(f"Tool call failed: {e}")
+
+    async def __ainvoke_tool_call(self, tool_call, config):
+        async with self.__semaphore:
+            print(f"---calling {tool_call['name']}---")
+            await areport_progress("tools", f"Querying {tool_call['name']}", config)
+            tool_result = await self.tools_by_name[tool_call["name"]].ainvoke(
+                tool_call["args"]["query"], config
+            )
+            return tool_result.content
+
+    def __collect(self, futures):
+        """
+        Wait for every call until timeout seconds after submission. Calls still
+        queued then are cancelled; running ones are left to finish on their
+        worker, their result is discarded.
+        """
+        _, not_done = wait(futures, timeout=self.__timeout)
+        contents = []
+        for future in futures:
+            if future in not_done:
+                future.cancel()
+                print(f"Tool call timed out after {self.__timeout}s")
+                contents.append(
+                    ToolCallFailure(f"Tool call timed out after {self.__timeout} seconds")
+                )
+                continue
+            try:
+                contents.append(future.result())
+            except Exception as e:
+                print(f"Tool call failed: {e}")
+                contents.append(ToolCallFailure(f"Tool call failed: {e}"))
+        return contents
@@ -1,25 +1,102 @@
 import base64
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import PyPDF2
 import os
 from azure.ai.documentintelligence.models import AnalyzeDocumentRequest
 from azure.ai.documentintelligence import DocumentIntelligenceClient
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError
+
+RETRYABLE_STATUS_CODES = {429, 503}
+PAGE_BREAK = "<!-- PageBreak -->\n\n"
+# Auto-sized page ranges cover roughly this many bytes of the file's pages.
+# Every request still uploads the whole file, the range only limits the pages
+# analyzed, so this sizes the analysis work per request, not the payload.
+TARGET_RANGE_BYTES = 4 * 1024 * 1024
+MAX_PAGES_PER_REQUEST = 50
+
+class FilePayloads:
+    """Base64 payloads of the files being analyzed, encoded on first use and
+    dropped after the last of a file's page ranges."""
+
+    def __init__(self, encode, file_paths):
+        """
+        Args:
+            encode (callable): Returns the base64 payload of a file path
+            file_paths (list): File path of every page range job
+        """
+        self.__encode = encode
+        self.__remaining = {}
+        for file_path in file_paths:
+            self.__remaining[file_path] = self.__remaining.get(file_path, 0) + 1
+        self.__payloads = {}
+        self.__locks = {file_path: threading.Lock() for file_path in self.__remaining}
+
+    def acquire(self, file_path):
+        with self.__locks[file_path]:
+            if file_path not in self.__payloads:
+                self.__payloads[file_path] = self.__encode(file_path)
+            return self.__payloads[file_path]
+
+    def release(self, file_path):
+        with self.__locks[file_path]:
+            self.__remaining[file_path] -= 1
+            if not self.__remaining[file_path]:
+                self.__payloads.pop(file_path, None)
+
 
 class AzureDocumentExtraction:
 
-    def __init__(self, endpoint, key, input_path,supported_extension):
+    def __init__(self, endpoint, key, input_path,supported_extension,max_in_flight=1,max_retries=5,client=None,pages_per_request=1):
+        """
+        Args:
+            endpoint (str): Azure Document Intelligence endpoint
+            key (str): Azure Document Intelligence key
+            input_path (str): Folder containing the documents
+            supported_extension (list): File extensions to analyze
+            max_in_flight (int): Maximum number of analyze requests running at once across all files
+            max_retries (int): Retries for a request throttled with 429/503
+            client: Object exposing begin_analyze_document, e.g. a local stub for testing.
+                Defaults to a DocumentIntelligenceClient for endpoint and key.
+            pages_per_request (int): Contiguous pages sent in one analyze request.
+                None sizes the range per file from its bytes per page.
+        """
         self.__supported_extensions = supported_extension
-        self.__document_intelligence_client = DocumentIntelligenceClient(
+        self.__document_intelligence_client = client or DocumentIntelligenceClient(
             endpoint=endpoint,
             credential=AzureKeyCredential(key),
             headers={"x-ms-useragent": "sample-code-merge-cross-tables/1.0.0"},
         )
         self.__input_path = input_path
+        self.__max_in_flight = max(1, max_in_flight or 1)
+        self.__max_retries = max_retries
+        self.__pages_per_request = pages_per_request
+
+    def extract_content_from_folder(self, files=None):
+        """
+        Analyze documents in the input folder.
 
-    def extract_content_from_folder(self):
+        Page range requests of all files share one pool of at most
+        max_in_flight concurrent analyses and are stitched back together in
+        page order per file. A file is read and base64 encoded when its first
+        range is submitted, and its payload is dropped once its last range is
+        analyzed, so only the files with ranges in flight are held in memory.
+
+        Args:
+            files (list): Filenames to analyze, defaults to every file in the input folder
+        """
         print("---Extracting content from folder---")
         result_dict = {}
-        for filename in os.listdir(self.__input_path):
+        if files is None:
+            files = os.listdir(self.__input_path)
+
+        # jobs[i] = (filename, file_path, page_range)
+        jobs = []
+        total_pages_by_file = {}
+        for filename in files:
             file_path = os.path.join(self.__input_path, filename)
             file_extension = os.path.splitext(filename)[1].lower()
             print("Processing file:", filename)
@@ -27,14 +104,45 @@ class AzureDocumentExtraction:
                 os.path.isfile(file_path)
                 and file_extension in self.__supported_extensions
             ):
-                result_dict[filename] = []
                 total_pages = (
                     self.__get_pdf_page_count(file_path)
                     if file_extension == ".pdf"
                     else 1
                 )
-                page_result = self.__extract_content_per_doc(file_path, total_pages)
-                result_dict[filename].append(page_result)
+                total_pages_by_file[filename] = total_pages
+                chunk_size = self.__get_pages_per_request(
+                    os.path.getsize(file_path), total_pages
+                )
+                for start in range(1, total_pages + 1, chunk_size):
+                    end = min(start + chunk_size - 1, total_pages)
+                    page_range = f"{start}-{end}" if end > start else f"{start}"
+                    jobs.append((filename, file_path, page_range))
+
+        payloads = FilePayloads(
+            self.__file_to_base64, [file_path for _, file_path, _ in jobs]
+        )
+
+        def analyze(job):
+            _, file_path, page_range = job
+            try:
+                return self.__analyze_pages(payloads.acquire(file_path), page_range)
+            finally:
+                payloads.release(file_path)
+
+        if self.__max_in_flight == 1:
+            results = [analyze(job) for job in jobs]
+        else:
+            print(f"Analyzing {len(jobs)} page ranges with up to {self.__max_in_flight} requests in flight")
+            with ThreadPoolExecutor(max_workers=self.__max_in_flight) as executor:
+                results = list(executor.map(analyze, jobs))
+
+        for filename, total_pages in total_pages_by_file.items():
+            page_results = [
+                result
+                for (job_file, _, _), result in zip(jobs, results)
+                if job_file == filename
+            ]
+            result_dict[filename] = [self.__merge_page_results(page_results)]
         return result_dict
 
     def __get_pdf_page_count(self, pdf_path):
@@ -47,47 +155,79 @@ class AzureDocumentExtraction:
             print(f"Error: {e}")
             return 0
 
+    def __get_pages_per_request(self, file_size, total_pages):
+        """
+        Pages per request. Auto-sized from the file's average bytes per page so
+        a range covers ~TARGET_RANGE_BYTES of pages: dense pages get short
+        ranges, light ones longer ranges and so fewer whole-file uploads.
+        """
+        if self.__pages_per_request:
+            return self.__pages_per_request
+        if total_pages <= 1:
+            return 1
+        bytes_per_page = max(1, file_size // total_pages)
+        return max(1, min(MAX_PAGES_PER_REQUEST, TARGET_RANGE_BYTES // bytes_per_page))
+
     def __file_to_base64(self,file_path):
         with open(file_path, "rb") as file:
             return base64.b64encode(file.read()).decode("utf-8")
 
-    def __extract_content_per_doc(self, file_path, total_pages):
-        """Extracts tables from a document using Azure Document Intelligence."""
-        page_result = None
-        base64_data = self.__file_to_base64(file_path)
-
-        for page_num in range(1, total_pages + 1):
-            poller = self.__document_intelligence_client.begin_analyze_document(
-                "prebuilt-layout",
-                AnalyzeDocumentRequest(bytes_source=self.__file_to_base64(file_path)),
-                output_content_format="markdown",
-                pages=f"{page_num}",
-            )
-
-            result = poller.result()
-
-            if page_result is None:
-                page_result = result
-                if total_pages > 1:
-                    page_result.content += "<!-- PageBreak -->\n\n"
-                    page_result.pages[0].spans[0].length = len(page_result.content)
-                if "tables" not in page_result:
-                    page_result.tables = []
-            else:
-                prev_offset = len(page_result.content)
-                for table in result.tables or []:
-                    table.spans[0].offset += prev_offset
-                for paragraph in result.paragraphs or []:
-                    paragraph.spans[0].offset += prev_offset
-
-                page_result.pages.extend(result.pages)
-                page_result.tables.extend(result.tables or [])
-                page_result.paragraphs.extend(result.paragraphs or [])
-
-                if page_num < total_pages:
-                    result.content += "<!-- PageBreak -->\n\n"
-                    result.pages[0].spans[0].length = len(result.content)
-
-                page_result.content += result.content
+    def __analyze_pages(self, base64_data, pages):
+        """Runs one analyze request, backing off and retrying when throttled."""
+        for attempt in range(self.__max_retries + 1):
+            try:
+                poller = self.__document_intelligence_client.begin_analyze_document(
+                    "prebuilt-layout",
+                    AnalyzeDocumentRequest(bytes_source=base64_data),
+                    output_content_format="markdown",
+                    pages=f"{pages}",
+                )
+                return poller.result()
+            except HttpResponseError as e:
+                if e.status_code not in RETRYABLE_STATUS_CODES or attempt == self.__max_retries:
+                    raise
+                delay = self.__retry_delay(e, attempt)
+                print(f"Request for pages {pages} throttled ({e.status_code}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def __retry_delay(self, error, attempt):
+        retry_after = None
+        if error.response is not None:
+            retry_after = error.response.headers.get("Retry-After")
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return min(60, 2**attempt) + random.uniform(0, 1)
+
+    def __merge_page_results(self, results):
+        """
+        Stitches page range analyze results into one result.
+
+        Content is concatenated with a page break between ranges, and every span
+        of the pages, tables and paragraphs of a later range is rebased by the
+        length of the content that precedes it.
+        """
+        if not results:
+            return None
+
+        page_result = results[0]
+        for name in ("pages", "tables", "paragraphs"):
+            if getattr(page_result, name, None) is None:
+                setattr(page_result, name, [])
+
+        for result in results[1:]:
+            page_result.content += PAGE_BREAK
+            if page_result.pages and page_result.pages[-1].spans:
+                page_result.pages[-1].spans[-1].length += len(PAGE_BREAK)
+
+            prev_offset = len(page_result.content)
+            for name in ("pages", "tables", "paragraphs"):
+                items = getattr(result, name, None) or []
+                for item in items:
+                    for span in item.spans or []:
+                        span.offset += prev_offset
+                getattr(page_result, name).extend(items)
+
+            page_result.content += result.content
 
         return page_result
@@ -1,12 +1,14 @@
 class TableProcessor:
 
-    def __init__(self, merged_table_identifier, document_table_merger, table_organizer,content,html_table_converter,csv_to_sql_converter):
+    def __init__(self, merged_table_identifier, document_table_merger, table_organizer,content,html_table_converter,csv_to_sql_converter,removed_files=None):
         self.__merged_table_identifier = merged_table_identifier
         self.__document_table_merger = document_table_merger
         self.__table_organizer = table_organizer
         self.__html_table_converter = html_table_converter
         self.__csv_to_sql_converter = csv_to_sql_converter
         self.__extracted_content = content
+        # None means content covers the whole corpus and outputs are rebuilt from scratch
+        self.__removed_files = removed_files
 
     def merge_and_organize_tables(self):
         print("---identifying merge table candidates and table integral span---")
@@ -25,7 +27,17 @@ class TableProcessor:
         for filename,results in final_table_list.items():
             for merged_table in results["merged"]:
                 merged_table["content"] = self.__document_table_merger.merge_html_tables(merged_table["content"])
+        if self.__removed_files is None:
+            print("---converting html tables to csv---")
+            self.__html_table_converter.convert_tables(final_table_list)
+            print("---converting csv tables to sql---")
+            self.__csv_to_sql_converter.convert_csvs()
+            return
+        folder_name = self.__html_table_converter.folder_name
         print("---converting html tables to csv---")
-        self.__html_table_converter.convert_tables(final_table_list)
+        self.__html_table_converter.convert_tables(final_table_list,stale_files=list(self.__extracted_content)+list(self.__removed_files))
         print("---converting csv tables to sql---")
-        self.__csv_to_sql_converter.convert_csvs()
+        self.__csv_to_sql_converter.convert_csvs(
+            folder_names=[folder_name(filename) for filename in self.__extracted_content],
+            removed_folder_names=[folder_name(filename) for filename in self.__removed_files],
+        )
@@ -20,21 +20,32 @@ class CSVToSQLConverter:
         self.__database_folder = database_folder
         self.__csv_folder = csv_folder
 
-    def convert_csvs(self):
+    def convert_csvs(self, folder_names=None, removed_folder_names=()):
         """
         Convert CSV files in subfolders to SQLite databases.
 
         Args:
-            csv_folder (str): Path to the folder containing subfolders with CSV files
+            folder_names (list): Subfolders to (re)convert. If None, the database
+                folder is recreated and every subfolder is converted.
+            removed_folder_names (list): Subfolders whose databases should be deleted
         """
-        # Create the database folder
-        if os.path.exists(self.__database_folder):
-            shutil.rmtree(self.__database_folder)
-        os.makedirs(self.__database_folder)
-        print(f"Recreated database folder: {self.__database_folder}")
+        if folder_names is None:
+            # Create the database folder
+            if os.path.exists(self.__database_folder):
+                shutil.rmtree(self.__database_folder)
+            os.makedirs(self.__database_folder)
+            print(f"Recreated database folder: {self.__database_folder}")
+            folder_names = os.listdir(self.__csv_folder)
+        else:
+            os.makedirs(self.__database_folder, exist_ok=True)
+            for folder_name in list(folder_names) + list(removed_folder_names):
+                db_path = os.path.join(self.__database_folder, f"{folder_name}.db")
+                if os.path.exists(db_path):
+                    os.remove(db_path)
+                    print(f"Removed database {folder_name}.db")
 
         # Skip hidden folders and process only valid subfolders
-        for folder_name in os.listdir(self.__csv_folder):
+        for folder_name in folder_names:
             # Skip hidden folders or files
             if folder_name.startswith("."):
                 print(f"Skipping hidden folder/file: {folder_name}")
@@ -20,22 +20,32 @@ class HTMLTableConverter:
         self.__output_folder = output_folder
         self.__llm = llm
 
-    def convert_tables(self, table_list):
+    def convert_tables(self, table_list, stale_files=None):
         """
         Convert HTML tables to CSV files.
 
         Args:
             table_list (dict): Dictionary containing tables organized by filename
+            stale_files (list): Filenames whose previous CSV folders should be
+                removed. If None, the whole output folder is recreated.
         """
-        if os.path.exists(self.__output_folder):
-            shutil.rmtree(self.__output_folder)
-        os.makedirs(self.__output_folder)
-        print(f"Recreated csv folder: {self.__output_folder}")
+        if stale_files is None:
+            if os.path.exists(self.__output_folder):
+                shutil.rmtree(self.__output_folder)
+            os.makedirs(self.__output_folder)
+            print(f"Recreated csv folder: {self.__output_folder}")
+        else:
+            os.makedirs(self.__output_folder, exist_ok=True)
+            for filename in stale_files:
+                file_folder = os.path.join(
+                    self.__output_folder, self.folder_name(filename)
+                )
+                if os.path.exists(file_folder):
+                    shutil.rmtree(file_folder)
+                    print(f"Removed csv folder: {file_folder}")
 
         for filename, results in table_list.items():
-            file_folder = os.path.join(
-                self.__output_folder, filename.replace(".pdf", "")
-            )
+            file_folder = os.path.join(self.__output_folder, self.folder_name(filename))
             os.makedirs(file_folder, exist_ok=True)
 
             for index, merged_table in enumerate(results.get("merged", [])):
@@ -46,6 +56,19 @@ class HTMLTableConverter:
                     not_merged_table, file_folder, f"not_merged_{index}"
                 )
 
+    @staticmethod
+    def folder_name(filename):
+        """
+        Name of the CSV folder (and therefore the database) for a document.
+
+        Args:
+            filename (str): Name of the source document
+
+        Returns:
+            str: Folder name
+        """
+        return filename.replace(".pdf", "")
+
     def _process_table(self, table_data, folder_path, table_id):
         """
         Process a single table and convert it to CSV.
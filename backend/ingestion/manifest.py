@@ -0,0 +1,118 @@
+import os
+from utils import hash_file
+
+
+class ManifestDiff:
+    """Filenames grouped by how they changed between two manifest scans."""
+
+    def __init__(self, added, changed, removed, unchanged):
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+        self.unchanged = unchanged
+
+    @property
+    def to_process(self):
+        """Files that have to be extracted, summarized and embedded."""
+        return self.added + self.changed
+
+    @property
+    def to_delete(self):
+        """Files whose previous vectors, docstore entries and outputs are stale."""
+        return self.changed + self.removed
+
+    @property
+    def has_changes(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self):
+        return (
+            f"ManifestDiff(added={len(self.added)}, changed={len(self.changed)}, "
+            f"removed={len(self.removed)}, unchanged={len(self.unchanged)})"
+        )
+
+
+class IngestionManifest:
+    """
+    Tracks the input documents (size, mtime, content hash) that the current
+    index was built from, so ingestion only touches files that were added,
+    modified or removed since the last run.
+
+    Every document is also assigned a stable integer slot that names its
+    extraction output folder (pdf-{slot}), so re-extracting one file never
+    renames or overwrites another file's images.
+    """
+
+    def __init__(self, input_path, entries=None):
+        """
+        Args:
+            input_path (str): Folder containing the input documents
+            entries (dict): Previously saved manifest entries keyed by filename
+        """
+        self.__input_path = input_path
+        self.__entries = dict(entries or {})
+
+    def scan(self):
+        """
+        Stat every input file and hash the ones whose size or mtime changed.
+
+        Returns:
+            dict: Manifest entries keyed by filename
+        """
+        current = {}
+        next_slot = max((entry["slot"] for entry in self.__entries.values()), default=0)
+        for filename in sorted(os.listdir(self.__input_path)):
+            file_path = os.path.join(self.__input_path, filename)
+            if not os.path.isfile(file_path):
+                continue
+            stat = os.stat(file_path)
+            previous = self.__entries.get(filename)
+            if (
+                previous
+                and previous["size"] == stat.st_size
+                and previous["mtime"] == stat.st_mtime_ns
+            ):
+                file_hash = previous["hash"]
+            else:
+                file_hash = hash_file(file_path)
+
+            if previous:
+                slot = previous["slot"]
+            else:
+                next_slot += 1
+                slot = next_slot
+
+            current[filename] = {
+                "path": file_path,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "hash": file_hash,
+                "slot": slot,
+            }
+        return current
+
+    def diff(self, current):
+        """
+        Compare a fresh scan against the stored entries.
+
+        Args:
+            current (dict): Output of scan()
+
+        Returns:
+            ManifestDiff: Added, changed, removed and unchanged filenames
+        """
+        added, changed, unchanged = [], [], []
+        for filename, entry in current.items():
+            previous = self.__entries.get(filename)
+            if previous is None:
+                added.append(filename)
+            elif previous["hash"] != entry["hash"]:
+                changed.append(filename)
+            else:
+                unchanged.append(filename)
+        removed = [filename for filename in self.__entries if filename not in current]
+        return ManifestDiff(added, changed, removed, unchanged)
+
+    @property
+    def entries(self):
+        return self.__entries
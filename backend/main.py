@@ -32,6 +32,16 @@ from llm_config import (
 from rag.summarize_document import DocumentSummarizer
 from rag.create_rag_chain import MultiModalRAGChain
 from rag.create_retriever import MultiDocumentRetriever
+from rag.index_snapshot import IndexSnapshot
+from rag.summary_cache import SummaryCache
+from rag.image_dedup import ImageDeduplicator
+from rag.document_store import ImageFileStore
+from rag.embedding_pipeline import CachedBatchEmbeddings
+from rag.index_factory import FaissIndexFactory
+from rag.text_chunker import SectionChunker
+from rag.hybrid_retriever import RankFusion
+from rag.context_packer import ContextPacker
+from ingestion.manifest import IngestionManifest
 import os
 import base64
 from dotenv import load_dotenv
@@ -41,7 +51,11 @@ from langserve import add_routes
 from tools.sql_agent_factory import SQLAgentToolFactory
 from tools.models import ResponseFormatter
 from agent.graph_builder import GraphBuilder
+from agent.chat_history import ChatHistoryStore
+from agent.history_compactor import HistoryCompactor
+from agent.answer_cache import SemanticAnswerCache
 import asyncio
+import uuid
 import concurrent.futures
 from fastapi.responses import JSONResponse
 from PIL import Image
@@ -80,20 +94,120 @@ AZURE_ENDPOINT = os.getenv("AZURE_ENDPOINT")
 AZURE_DOCUMENT_INTELLEGENCE_KEY = os.getenv("AZURE_DOCUMENT_INTELLEGENCE_KEY")
 DATABASE_FOLDER_PATH = os.getenv("DATABASE_FOLDER_PATH")
 CSV_FOLDER_PATH = os.getenv("CSV_FOLDER_PATH")
+INDEX_SNAPSHOT_PATH = os.getenv("INDEX_SNAPSHOT_PATH", "./data/index_snapshot")
+PARTITION_WORKERS = int(os.getenv("PARTITION_WORKERS", "1"))
+PARTITION_PAGES_PER_CHUNK = int(os.getenv("PARTITION_PAGES_PER_CHUNK", "0"))
+AZURE_MAX_IN_FLIGHT = int(os.getenv("AZURE_MAX_IN_FLIGHT", "8"))
+# 0 sizes each file's page ranges from its bytes per page
+AZURE_PAGES_PER_REQUEST = int(os.getenv("AZURE_PAGES_PER_REQUEST", "0"))
+SUMMARY_REQUESTS_PER_MINUTE = int(os.getenv("SUMMARY_REQUESTS_PER_MINUTE", "15"))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "0"))
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", "./data/cache/summaries.sqlite")
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "100000"))
+IMAGE_DEDUP_MAX_DISTANCE = int(os.getenv("IMAGE_DEDUP_MAX_DISTANCE", "5"))
+IMAGE_MIN_PIXELS = int(os.getenv("IMAGE_MIN_PIXELS", "4096"))
+IMAGE_STORE_PATH = os.getenv(
+    "IMAGE_STORE_PATH", os.path.join(INDEX_SNAPSHOT_PATH, "images")
+)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./data/cache/embeddings.sqlite")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_REQUESTS_PER_SECOND = float(os.getenv("EMBEDDING_REQUESTS_PER_SECOND", "2"))
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")
+VECTOR_INDEX_NLIST = int(os.getenv("VECTOR_INDEX_NLIST", "0"))
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "16"))
+VECTOR_INDEX_HNSW_M = int(os.getenv("VECTOR_INDEX_HNSW_M", "32"))
+VECTOR_INDEX_EF_SEARCH = int(os.getenv("VECTOR_INDEX_EF_SEARCH", "64"))
+VECTOR_INDEX_PQ_M = int(os.getenv("VECTOR_INDEX_PQ_M", "16"))
+VECTOR_INDEX_BENCHMARK = os.getenv("VECTOR_INDEX_BENCHMARK", "false").lower() == "true"
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "512"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+RETRIEVAL_VECTOR_WEIGHT = float(os.getenv("RETRIEVAL_VECTOR_WEIGHT", "1.0"))
+RETRIEVAL_KEYWORD_WEIGHT = float(os.getenv("RETRIEVAL_KEYWORD_WEIGHT", "1.0"))
+RETRIEVAL_TEXT_WEIGHT = float(os.getenv("RETRIEVAL_TEXT_WEIGHT", "1.0"))
+RETRIEVAL_TABLE_WEIGHT = float(os.getenv("RETRIEVAL_TABLE_WEIGHT", "1.0"))
+RETRIEVAL_IMAGE_WEIGHT = float(os.getenv("RETRIEVAL_IMAGE_WEIGHT", "1.0"))
+# Prompt context budget of the multimodal RAG chain
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+CONTEXT_MAX_IMAGES = int(os.getenv("CONTEXT_MAX_IMAGES", "3"))
+CONTEXT_MAX_IMAGE_PIXELS = int(os.getenv("CONTEXT_MAX_IMAGE_PIXELS", str(768 * 768)))
+# Parallel SQL tool calls per question, and per-turn timeout in seconds (0 = none)
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "120"))
+SQL_MEMO_MAX_ENTRIES = int(os.getenv("SQL_MEMO_MAX_ENTRIES", "256"))
+# Schema cards in the SQL agents' prompts; the list/info tools are only kept with SQL_SCHEMA_TOOLS
+SQL_SCHEMA_CARDS = os.getenv("SQL_SCHEMA_CARDS", "true").lower() == "true"
+SQL_SCHEMA_TOOLS = os.getenv("SQL_SCHEMA_TOOLS", "false").lower() == "true"
+MONGODB_CONNECTION_STRING = os.getenv(
+    "MONGODB_CONNECTION_STRING", "mongodb://localhost:27017"
+)
+MONGODB_DATABASE = os.getenv("MONGODB_DATABASE", "my_db")
+MONGODB_CHAT_COLLECTION = os.getenv("MONGODB_CHAT_COLLECTION", "chat_histories")
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+CHAT_HISTORY_CACHE_SESSIONS = int(os.getenv("CHAT_HISTORY_CACHE_SESSIONS", "1024"))
+CHAT_HISTORY_FLUSH_INTERVAL = float(os.getenv("CHAT_HISTORY_FLUSH_INTERVAL", "0.5"))
+CHAT_HISTORY_FLUSH_BATCH_SIZE = int(os.getenv("CHAT_HISTORY_FLUSH_BATCH_SIZE", "100"))
+CHAT_HISTORY_RECENT_MESSAGES = int(os.getenv("CHAT_HISTORY_RECENT_MESSAGES", "6"))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+# Semantic cache of final answers, invalidated when the index or a .db file changes
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_PER_SESSION = os.getenv("ANSWER_CACHE_PER_SESSION", "false").lower() == "true"
+# Serve from the saved index snapshot (read-only, files shared by all workers) without ingesting
+SERVE_FROM_SNAPSHOT = os.getenv("SERVE_FROM_SNAPSHOT", "false").lower() == "true"
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
 
 llm_with_fallbacks = gemini.with_fallbacks([backup_gemini, groq, backup_groq])
 llm_with_fallbacks2 = groq.with_fallbacks([backup_groq, gemini, backup_gemini])
+cached_embeddings = CachedBatchEmbeddings(
+    embeddings,
+    EMBEDDING_CACHE_PATH,
+    batch_size=EMBEDDING_BATCH_SIZE,
+    max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+    requests_per_second=EMBEDDING_REQUESTS_PER_SECOND,
+)
+context_packer = ContextPacker(
+    max_tokens=CONTEXT_MAX_TOKENS,
+    max_images=CONTEXT_MAX_IMAGES,
+    max_image_pixels=CONTEXT_MAX_IMAGE_PIXELS,
+)
+
 
+def create_sql_tools(snapshot):
+    factory = SQLAgentToolFactory(
+        database_folder=DATABASE_FOLDER_PATH,
+        llm=llm_with_fallbacks,
+        response_structure=ResponseFormatter,
+        tool_metadata=snapshot.load_tool_metadata(),
+        memo_size=SQL_MEMO_MAX_ENTRIES,
+        schema_cards=SQL_SCHEMA_CARDS,
+        schema_tools=SQL_SCHEMA_TOOLS,
+    )
 
-def extract_with_azure():
+    # Create all tools
+    all_tools = factory.create_tools()
+    return all_tools, factory.tool_metadata
+
+
+def extract_with_azure(snapshot, diff):
     # azure_document_extractor = AzureDocumentExtraction(
     #     endpoint=AZURE_ENDPOINT,
     #     key=AZURE_DOCUMENT_INTELLEGENCE_KEY,
     #     input_path=INITIAL_DOCUMENT_PATH,
-    #     supported_extension=EXTENSIONS
+    #     supported_extension=EXTENSIONS,
+    #     max_in_flight=AZURE_MAX_IN_FLIGHT,
+    #     pages_per_request=AZURE_PAGES_PER_REQUEST or None,
     # )
 
-    # extracted_content = azure_document_extractor.extract_content_from_folder()
+    # extracted_content = azure_document_extractor.extract_content_from_folder(
+    #     files=diff.to_process
+    # )
     # table_processor = TableProcessor(
     #     merged_table_identifier=MergedTableIdentifier(),
     #     document_table_merger=DocumentTableMerger(),
@@ -101,32 +215,155 @@ def extract_with_azure():
     #     content=extracted_content,
     #     html_table_converter=HTMLTableConverter(CSV_FOLDER_PATH, llm_with_fallbacks2),
     #     csv_to_sql_converter=CSVToSQLConverter(DATABASE_FOLDER_PATH, CSV_FOLDER_PATH),
+    #     removed_files=diff.removed,
     # )
 
-    # table_processor.merge_and_organize_tables()
+    # if diff.has_changes:
+    #     table_processor.merge_and_organize_tables()
 
-    factory = SQLAgentToolFactory(
-        database_folder=DATABASE_FOLDER_PATH,
-        llm=llm_with_fallbacks,
-        response_structure=ResponseFormatter,
-    )
-
-    # Create all tools
-    all_tools = factory.create_tools()
+    all_tools, tool_metadata = create_sql_tools(snapshot)
+    snapshot.save_tool_metadata(tool_metadata)
     return all_tools
 
 
-def extract_with_partition():
+def load_document_retriever(snapshot, read_only=False):
+    document_retriever = MultiDocumentRetriever(
+        embedding_model=cached_embeddings,
+        index_factory=FaissIndexFactory(
+            index_type=VECTOR_INDEX_TYPE,
+            nlist=VECTOR_INDEX_NLIST or None,
+            nprobe=VECTOR_INDEX_NPROBE,
+            hnsw_m=VECTOR_INDEX_HNSW_M,
+            ef_search=VECTOR_INDEX_EF_SEARCH,
+            pq_m=VECTOR_INDEX_PQ_M,
+        ),
+        rank_fusion=(
+            RankFusion(
+                k=RETRIEVAL_K,
+                fetch_k=RETRIEVAL_FETCH_K,
+                rrf_k=RETRIEVAL_RRF_K,
+                vector_weight=RETRIEVAL_VECTOR_WEIGHT,
+                keyword_weight=RETRIEVAL_KEYWORD_WEIGHT,
+                modality_weights={
+                    "text": RETRIEVAL_TEXT_WEIGHT,
+                    "table": RETRIEVAL_TABLE_WEIGHT,
+                    "image": RETRIEVAL_IMAGE_WEIGHT,
+                },
+            )
+            if HYBRID_SEARCH
+            else None
+        ),
+    )
+    summaries = {}
+    if snapshot.has_index():
+        vectorstore, docstore, doc_ids_by_source, summaries = snapshot.load_index(
+            cached_embeddings, read_only=read_only
+        )
+        document_retriever.load_retriever(
+            vectorstore,
+            docstore,
+            doc_ids_by_source,
+            snapshot.load_keyword_index() if HYBRID_SEARCH else None,
+        )
+    return document_retriever, summaries
+
+
+def remove_extracted_output(filename, slot):
+    """Delete the images extracted from a document that was changed or removed."""
+    _, ext = os.path.splitext(filename)
+    if ext.lower() in IMAGE_EXTENSIONS:
+        image_path = os.path.join(EXTRACTED_DATA_PATH, "uploaded_images", filename)
+        if os.path.exists(image_path):
+            os.remove(image_path)
+    else:
+        delete_folder(f"{EXTRACTED_DATA_PATH}/pdf-{slot}")
+
+
+def extract_with_partition(snapshot, diff, manifest_entries):
+    document_retriever, summaries = load_document_retriever(snapshot)
+    if not diff.has_changes:
+        print("---documents unchanged, using index snapshot---")
+        retriever = document_retriever.get_retriever()
+        rag_chain = MultiModalRAGChain(
+            retriever, llm_with_fallbacks, context_packer
+        ).create_chain()
+        return retriever, rag_chain
+
+    previous_entries = snapshot.load_manifest()
+    # One batch, so an HNSW index is rebuilt once for all stale documents.
+    document_retriever.delete_sources(diff.to_delete)
+    for filename in diff.to_delete:
+        summaries.pop(filename, None)
+        remove_extracted_output(filename, previous_entries[filename]["slot"])
+
+    files = diff.to_process
+    image_files = [
+        f for f in files if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS
+    ]
+    for filename in image_files:
+        copy_image_to_folder(
+            os.path.join(INITIAL_DOCUMENT_PATH, filename), EXTRACTED_DATA_PATH
+        )
 
     unstrcutured_document_extractor = UnstructuredDocumentExtraction(
-        INITIAL_DOCUMENT_PATH, EXTRACTED_DATA_PATH
+        INITIAL_DOCUMENT_PATH,
+        EXTRACTED_DATA_PATH,
+        max_workers=PARTITION_WORKERS,
+        pages_per_chunk=PARTITION_PAGES_PER_CHUNK or None,
+    )
+    unstrcutured_document_extractor.extract_content_from_folder(
+        files=files,
+        image_slots={f: manifest_entries[f]["slot"] for f in files},
     )
-    unstrcutured_document_extractor.extract_content_from_folder()
-    doc_summarizer = DocumentSummarizer(llm_with_fallbacks, [gemini_key, gemini_second_backup, gemini_backup])
-    img_base64_list, image_summaries = doc_summarizer.generate_img_summaries(
-        EXTRACTED_DATA_PATH
+    summary_cache = SummaryCache(SUMMARY_CACHE_PATH, SUMMARY_CACHE_MAX_ENTRIES)
+    doc_summarizer = DocumentSummarizer(
+        llm_with_fallbacks,
+        [gemini_key, gemini_second_backup, gemini_backup],
+        requests_per_minute=SUMMARY_REQUESTS_PER_MINUTE,
+        max_concurrency=SUMMARY_MAX_CONCURRENCY or None,
+        summary_cache=summary_cache,
     )
 
+    image_paths_by_file = {}
+    tables_by_file = {}
+    for filename in files:
+        elements = unstrcutured_document_extractor.elements_by_file.get(filename, {})
+        tables_by_file[filename] = elements.get("Table", [])
+        if filename in image_files:
+            image_paths_by_file[filename] = [
+                os.path.join(EXTRACTED_DATA_PATH, "uploaded_images", filename)
+            ]
+        else:
+            image_paths_by_file[filename] = doc_summarizer.list_images(
+                unstrcutured_document_extractor.image_dir(
+                    manifest_entries[filename]["slot"]
+                )
+            )
+
+    # Collapse near-duplicate and tiny images before any LLM call; one
+    # representative per group is summarized for all documents in this run.
+    representative_of = ImageDeduplicator(
+        max_distance=IMAGE_DEDUP_MAX_DISTANCE, min_pixels=IMAGE_MIN_PIXELS
+    ).deduplicate(
+        [path for filename in files for path in image_paths_by_file[filename]]
+    )
+    representatives = list(
+        dict.fromkeys(path for path in representative_of.values() if path)
+    )
+
+    # Summarize across all new documents at once so batching spans files.
+    print("---Summarizing images---")
+    img_base64_list, image_summaries = doc_summarizer.summarize_images(
+        representatives
+    )
+    # Only a small record per image stays in the docstore; the bytes live on disk.
+    image_store = ImageFileStore(IMAGE_STORE_PATH)
+    image_by_representative = {
+        path: (image_store.put(path), summary)
+        for path, summary in zip(representatives, image_summaries)
+    }
+    del img_base64_list
+
     def write_list_to_file(filename, data_list):
         """Writes a list of items to a text file, each on a new line."""
         with open(filename, "w", encoding="utf-8") as file:
@@ -137,87 +374,261 @@ def extract_with_partition():
     print("List written to file successfully!")
 
     tab_summaries = doc_summarizer.generate_tab_summaries(
-        unstrcutured_document_extractor.tab
+        [table for filename in files for table in tables_by_file[filename]]
     )
-    retriever = MultiDocumentRetriever(
-        embedding_model=embeddings,
-        text=unstrcutured_document_extractor.NarrativeText,
-        tab=unstrcutured_document_extractor.tab,
-        base64_img=img_base64_list,
-        tab_summaries=tab_summaries,
-        image_summaries=image_summaries,
-    ).create_retriever()
+    summary_cache.close()
 
-    rag_chain = MultiModalRAGChain(retriever, llm_with_fallbacks).create_chain()
+    chunker = SectionChunker(
+        max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS
+    )
+    tab_offset = 0
+    new_sources = {}
+    for filename in files:
+        # Each document indexes one entry per duplicate group it contains, so
+        # deleting a document never removes images another document relies on.
+        file_paths = image_paths_by_file[filename]
+        file_images = [
+            image_by_representative[path]
+            for path in dict.fromkeys(
+                representative_of[p] for p in file_paths if representative_of[p]
+            )
+        ]
+        file_image_summaries = [summary for _, summary in file_images]
+        tab_count = len(tables_by_file[filename])
+        file_tab_summaries = tab_summaries[tab_offset : tab_offset + tab_count]
+        new_sources[filename] = {
+            "text": chunker.chunk(
+                filename,
+                unstrcutured_document_extractor.elements_by_file.get(
+                    filename, {}
+                ).get("TextElements", []),
+            ),
+            "tab": tables_by_file[filename],
+            "images": [record for record, _ in file_images],
+            "tab_summaries": file_tab_summaries,
+            "image_summaries": file_image_summaries,
+        }
+        summaries[filename] = {
+            "image_summaries": file_image_summaries,
+            "tab_summaries": file_tab_summaries,
+            "duplicate_images": {
+                path: representative_of[path]
+                for path in file_paths
+                if representative_of[path] not in (None, path)
+            },
+        }
+        tab_offset += tab_count
+    # One batch, so a new index is built and trained over every new document.
+    document_retriever.add_sources(new_sources)
+
+    docstore_items = document_retriever.docstore_items
+    snapshot.save_index(
+        manifest_entries,
+        document_retriever.vectorstore,
+        docstore_items,
+        document_retriever.doc_ids_by_source,
+        summaries,
+        document_retriever.keyword_index,
+    )
+    image_store.prune(record for _, record in docstore_items)
+    if VECTOR_INDEX_BENCHMARK:
+        document_retriever.benchmark_index()
+
+    retriever = document_retriever.get_retriever()
+    rag_chain = MultiModalRAGChain(
+        retriever, llm_with_fallbacks, context_packer
+    ).create_chain()
 
     return retriever, rag_chain
 
 
 def process_document_type():
-    delete_folder(EXTRACTED_DATA_PATH)
     for file in os.listdir(INITIAL_DOCUMENT_PATH):
         ext = "." + file.split(".")[-1] if "." in file else ""
         filename = os.path.join(INITIAL_DOCUMENT_PATH, file)
         if ext not in EXTENSIONS:
             raise ValueError(f"Unsupported file format: {ext}")
-        elif ext in IMAGE_EXTENSIONS:
-            copy_image_to_folder(filename, EXTRACTED_DATA_PATH)
         elif ext == ".docx":
             convert_to_pdf(filename)
 
 
 async def main():
+    snapshot = IndexSnapshot(INDEX_SNAPSHOT_PATH)
+    if not snapshot.has_index():
+        delete_folder(EXTRACTED_DATA_PATH)
+    # Convert .docx before scanning so the manifest tracks the .pdf that is indexed.
     process_document_type()
+    manifest = IngestionManifest(INITIAL_DOCUMENT_PATH, snapshot.load_manifest())
+    manifest_entries = manifest.scan()
+    diff = manifest.diff(manifest_entries)
+    print(f"---ingestion manifest: {diff}---")
 
     loop = asyncio.get_running_loop()
     with concurrent.futures.ThreadPoolExecutor() as executor:
-        azure_task = loop.run_in_executor(executor, extract_with_azure)
-        partition_task = loop.run_in_executor(executor, extract_with_partition)
+        azure_task = loop.run_in_executor(executor, extract_with_azure, snapshot, diff)
+        partition_task = loop.run_in_executor(
+            executor, extract_with_partition, snapshot, diff, manifest_entries
+        )
 
         all_tools = await azure_task
         retriever, rag_chain = await partition_task
 
-        model_with_tool = llm_with_fallbacks.bind_tools(all_tools)
-        graph = GraphBuilder(
-            model_with_tool, rag_chain, llm_with_fallbacks2, all_tools
-        ).build()
-
-        add_routes(
-            app,
-            graph,
-            path="/agent",
+    register_routes(all_tools, retriever, rag_chain)
+
+
+def session_config(config, request):
+    """
+    Put the X-Session-Id header into the request config as the chat session id.
+    Requests without one get a fresh id, shared by all nodes of the run.
+    """
+    configurable = config.setdefault("configurable", {})
+    session_id = request.headers.get("X-Session-Id")
+    if session_id:
+        configurable["session_id"] = session_id
+    elif not configurable.get("session_id"):
+        configurable["session_id"] = f"anonymous-{uuid.uuid4()}"
+    return config
+
+
+def corpus_version():
+    """
+    Identity of the data answers are drawn from: the index snapshot manifest,
+    rewritten by every ingestion that changes the documents, and the .db files.
+    """
+    paths = [os.path.join(INDEX_SNAPSHOT_PATH, IndexSnapshot.MANIFEST_FILE)]
+    if DATABASE_FOLDER_PATH and os.path.isdir(DATABASE_FOLDER_PATH):
+        paths.extend(
+            os.path.join(DATABASE_FOLDER_PATH, file)
+            for file in sorted(os.listdir(DATABASE_FOLDER_PATH))
+            if file.endswith(".db")
         )
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            version.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            version.append((path, None, None))
+    return tuple(version)
+
+
+def register_routes(all_tools, retriever, rag_chain):
+    model_with_tool = llm_with_fallbacks.bind_tools(all_tools)
+    history_store = ChatHistoryStore(
+        MONGODB_CONNECTION_STRING,
+        MONGODB_DATABASE,
+        MONGODB_CHAT_COLLECTION,
+        max_pool_size=MONGODB_MAX_POOL_SIZE,
+        history_size=CHAT_HISTORY_RECENT_MESSAGES,
+        cache_sessions=CHAT_HISTORY_CACHE_SESSIONS,
+        flush_interval=CHAT_HISTORY_FLUSH_INTERVAL,
+        flush_batch_size=CHAT_HISTORY_FLUSH_BATCH_SIZE,
+    )
+    history_compactor = HistoryCompactor(
+        llm_with_fallbacks2, history_store, max_tokens=CHAT_HISTORY_TOKEN_BUDGET
+    )
+    # Messages are written behind the request; finish pending summaries, then
+    # flush what is left on shutdown.
+    app.add_event_handler("shutdown", history_compactor.aclose)
+    app.add_event_handler("shutdown", history_store.close)
+    graph = GraphBuilder(
+        model_with_tool,
+        rag_chain,
+        llm_with_fallbacks2,
+        all_tools,
+        history_store,
+        tool_max_concurrency=TOOL_MAX_CONCURRENCY,
+        tool_timeout=TOOL_CALL_TIMEOUT or None,
+        history_compactor=history_compactor,
+        answer_cache=(
+            SemanticAnswerCache(
+                cached_embeddings,
+                version=corpus_version,
+                threshold=ANSWER_CACHE_THRESHOLD,
+                max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                ttl=ANSWER_CACHE_TTL,
+                per_session=ANSWER_CACHE_PER_SESSION,
+            )
+            if ANSWER_CACHE
+            else None
+        ),
+    ).build()
+
+    add_routes(
+        app,
+        graph,
+        path="/agent",
+        per_req_config_modifier=session_config,
+    )
 
-        @app.get("/query_image")
-        async def query_image(query: str):
-            docs = retriever.invoke(query)
-            source_docs = split_image_text_types(docs)
-
-            image_responses = []
-            for base64_str in source_docs["images"]:
-                try:
-                    image_data = base64.b64decode(base64_str)
-                    image = Image.open(io.BytesIO(image_data))
-
-                    img_io = io.BytesIO()
-                    image.save(img_io, format="PNG")
-                    img_io.seek(0)
-
-                    encoded_img = base64.b64encode(img_io.getvalue()).decode("utf-8")
-                    image_responses.append(f"data:image/png;base64,{encoded_img}")
+    @app.get("/query_image")
+    async def query_image(query: str):
+        docs = await retriever.ainvoke(query)
+        try:
+            # Reading and re-encoding the images blocks, keep it off the event loop.
+            image_responses = await asyncio.to_thread(encode_query_images, docs)
+        except Exception as e:
+            return JSONResponse(content={"error": str(e)}, status_code=400)
+
+        return {"images": image_responses}
+
+
+def encode_query_images(docs):
+    """Convert the images among the retrieved records to PNG data URLs."""
+    source_docs = split_image_text_types(docs)
+
+    image_responses = []
+    for base64_str in source_docs["images"]:
+        image_data = base64.b64decode(base64_str)
+        image = Image.open(io.BytesIO(image_data))
+
+        img_io = io.BytesIO()
+        image.save(img_io, format="PNG")
+        img_io.seek(0)
+
+        encoded_img = base64.b64encode(img_io.getvalue()).decode("utf-8")
+        image_responses.append(f"data:image/png;base64,{encoded_img}")
+    return image_responses
+
+
+def serve_from_snapshot():
+    """
+    Build the agent from the saved index snapshot without running ingestion.
+
+    The docstores are read from SQLite and the FAISS index is opened
+    memory-mapped, so uvicorn workers share one copy of them through the page
+    cache; for Flat and HNSW indexes FAISS still reads the vectors into each
+    worker. The keyword index is restored from the snapshot.
+    """
+    snapshot = IndexSnapshot(INDEX_SNAPSHOT_PATH)
+    if not snapshot.has_index():
+        raise RuntimeError(
+            f"No index snapshot in {INDEX_SNAPSHOT_PATH}, run main.py once to build it"
+        )
+    document_retriever, _ = load_document_retriever(snapshot, read_only=True)
+    retriever = document_retriever.get_retriever()
+    rag_chain = MultiModalRAGChain(
+        retriever, llm_with_fallbacks, context_packer
+    ).create_chain()
+    all_tools, _ = create_sql_tools(snapshot)
+    register_routes(all_tools, retriever, rag_chain)
 
-                except Exception as e:
-                    return JSONResponse(content={"error": str(e)}, status_code=400)
 
-            return {"images": image_responses}
+# Workers import this module (uvicorn main:app --workers N) and each builds its
+# routes here; the launching process below only hands off to them.
+if SERVE_FROM_SNAPSHOT and __name__ != "__main__":
+    serve_from_snapshot()
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    asyncio.run(main())
+    if SERVE_FROM_SNAPSHOT:
+        uvicorn.run("main:app", host="localhost", port=8000, workers=SERVER_WORKERS)
+    else:
+        asyncio.run(main())
 
-    uvicorn.run(app, host="localhost", port=8000)
+        uvicorn.run(app, host="localhost", port=8000)
 
 """
 
@@ -225,7 +636,7 @@ pip install -U
 langchain langgraph langchain_groq langchain_google_genai langchain_community langchain_core langgraph.prebuilt 
 faiss-cpu "unstructured[all-docs]" transformers==4.37.2 pillow accelerate einops torchvision unstructured-pytesseract 
 pytesseract nltk==3.9.1 fastapi uvicorn docx2pdf tiktoken azure-ai-documentintelligence azure-ai-formrecognizer PyPDF2   
-langserve langchain_mongodb sse_starlette
+langserve langchain_mongodb sse_starlette motor
 
 need nltk, window word document for docx2pdf library, manually download pytesseract library and set as system variable
 """
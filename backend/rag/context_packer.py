@@ -0,0 +1,135 @@
+import base64
+import io
+import math
+import tiktoken
+from langchain_core.documents import Document
+from PIL import Image
+from rag.keyword_index import tokenize
+from utils import split_image_text_types
+
+
+class ContextPacker:
+    """
+    Turns retrieved records into a bounded prompt context.
+
+    Texts and tables are scored by retrieval rank plus term overlap with the
+    question. Near-duplicates (e.g. overlapping chunks) are dropped. The rest
+    are packed best first into max_tokens; the text that crosses the budget is
+    truncated if enough room is left. Images keep retrieval order, are capped
+    at max_images and are downsampled to at most max_image_pixels before being
+    base64 encoded.
+    """
+
+    def __init__(
+        self,
+        max_tokens=3000,
+        max_images=3,
+        max_image_pixels=768 * 768,
+        min_truncated_tokens=64,
+        duplicate_threshold=0.9,
+        encoding_name="cl100k_base",
+    ):
+        """
+        Args:
+            max_tokens (int): Token budget for texts and tables
+            max_images (int): Maximum images attached to the prompt
+            max_image_pixels (int): Maximum width * height of an attached image
+            min_truncated_tokens (int): Smallest remainder worth truncating a text into
+            duplicate_threshold (float): Term set Jaccard similarity at which a text
+                counts as a duplicate of one already packed
+            encoding_name (str): tiktoken encoding used to count tokens
+        """
+        self.__max_tokens = max_tokens
+        self.__max_images = max_images
+        self.__max_image_pixels = max_image_pixels
+        self.__min_truncated_tokens = min_truncated_tokens
+        self.__duplicate_threshold = duplicate_threshold
+        self.__encoding = tiktoken.get_encoding(encoding_name)
+
+    def pack(self, docs, question):
+        """
+        Args:
+            docs (list): Retrieved records, most relevant first
+            question (str): User question
+
+        Returns:
+            dict: "texts" and base64 "images" that fit the budgets
+        """
+        texts, images = [], []
+        for rank, doc in enumerate(docs):
+            # Image records are read from disk only if they make the cut.
+            if isinstance(doc, Document) and doc.metadata.get("kind") == "image":
+                images.append(("path", doc.metadata["path"]))
+                continue
+            parts = split_image_text_types([doc])
+            texts.extend((rank, text) for text in parts["texts"] if text.strip())
+            images.extend(("base64", image) for image in parts["images"])
+
+        packed_images = []
+        for source, image in images[: self.__max_images]:
+            encoded = self.__downsample(source, image)
+            if encoded:
+                packed_images.append(encoded)
+        return {"texts": self.__pack_texts(texts, question), "images": packed_images}
+
+    def __pack_texts(self, texts, question):
+        question_terms = set(tokenize(question))
+        scored = []
+        for rank, text in texts:
+            terms = set(tokenize(text))
+            overlap = (
+                len(question_terms & terms) / len(question_terms) if question_terms else 0
+            )
+            scored.append((1 / (rank + 1) + overlap, rank, text, terms))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+
+        packed, packed_terms = [], []
+        remaining = self.__max_tokens
+        for _, _, text, terms in scored:
+            if remaining < self.__min_truncated_tokens:
+                break
+            if any(
+                len(terms & other) / (len(terms | other) or 1) >= self.__duplicate_threshold
+                for other in packed_terms
+            ):
+                continue
+            tokens = self.__encoding.encode(text)
+            if len(tokens) > remaining:
+                text = self.__encoding.decode(tokens[:remaining]) + " ..."
+                tokens = tokens[:remaining]
+            packed.append(text)
+            packed_terms.append(terms)
+            remaining -= len(tokens)
+        return packed
+
+    def __downsample(self, source, image):
+        """
+        Args:
+            source (str): "path" for an image file, "base64" for inline image data
+            image (str): Path or base64 data
+
+        Returns:
+            str: Base64 JPEG within the pixel budget, None if unreadable
+        """
+        try:
+            if source == "base64":
+                data = base64.b64decode(image)
+            else:
+                with open(image, "rb") as file:
+                    data = file.read()
+            with Image.open(io.BytesIO(data)) as img:
+                width, height = img.size
+                if img.format == "JPEG" and width * height <= self.__max_image_pixels:
+                    return base64.b64encode(data).decode("utf-8")
+                if width * height > self.__max_image_pixels:
+                    scale = math.sqrt(self.__max_image_pixels / (width * height))
+                    img = img.resize(
+                        (max(1, int(width * scale)), max(1, int(height * scale))),
+                        Image.Resampling.LANCZOS,
+                    )
+                output = io.BytesIO()
+                img.convert("RGB").save(output, format="JPEG", quality=85)
+                return base64.b64encode(output.getvalue()).decode("utf-8")
+        except (OSError, ValueError) as e:
+            print(f"Error preparing image for the prompt: {e}")
+            return None
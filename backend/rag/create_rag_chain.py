@@ -1,12 +1,22 @@
 from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.messages import HumanMessage
 from langchain_core.output_parsers import StrOutputParser
-from utils import split_image_text_types
+from rag.context_packer import ContextPacker
 
 class MultiModalRAGChain:
-    def __init__(self, retriever_multi_vector_img, llm):
+    def __init__(self, retriever_multi_vector_img, llm, context_packer=None):
         self.__retriever_multi_vector_img = retriever_multi_vector_img
         self.__llm = llm
+        # Bounds the texts, tables and images sent to the LLM per question.
+        self.__context_packer = context_packer or ContextPacker()
+
+    def __pack_context(self, data_dict):
+        return {
+            "context": self.__context_packer.pack(
+                data_dict["docs"], data_dict["question"]
+            ),
+            "question": data_dict["question"],
+        }
 
     def __img_prompt_func(self, data_dict):
         """
@@ -43,10 +53,10 @@ class MultiModalRAGChain:
         print("Creating multimodal RAG chain")
         chain_multimodal_rag = (
             {
-                "context": self.__retriever_multi_vector_img
-                | RunnableLambda(split_image_text_types),
+                "docs": self.__retriever_multi_vector_img,
                 "question": RunnablePassthrough(),
             }
+            | RunnableLambda(self.__pack_context)
             | RunnableLambda(self.__img_prompt_func)
             | self.__llm
             | StrOutputParser()
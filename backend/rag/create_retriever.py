@@ -2,37 +2,282 @@ from langchain.storage import InMemoryStore
 from langchain.retrievers.multi_vector import MultiVectorRetriever
 from langchain_core.documents import Document
 import uuid
-from langchain_community.vectorstores import FAISS
+from rag.document_store import SQLiteDocStore, text_record
+from rag.index_factory import FaissIndexFactory
+from rag.keyword_index import BM25Index
+from rag.hybrid_retriever import HybridRetriever
 
 
 class MultiDocumentRetriever:
 
     def __init__(
-        self, embedding_model, text, tab, base64_img, tab_summaries, image_summaries
+        self,
+        embedding_model,
+        text=None,
+        tab=None,
+        images=None,
+        tab_summaries=None,
+        image_summaries=None,
+        index_factory=None,
+        rank_fusion=None,
     ):
+        text = list(text or [])
+        tab = list(tab or [])
         self.__embedding_model = embedding_model
-        self.__documents = text + tab + base64_img
-        self.__summary_docs = text + tab_summaries + image_summaries
+        self.__documents = self.__to_records(text, tab, images or [])
+        self.__summary_docs = (
+            self.__texts_of(text) + list(tab_summaries or []) + list(image_summaries or [])
+        )
         self.__docstore = InMemoryStore()
         self.__id_key = "doc_id"
+        self.__vectorstore = None
+        self.__doc_ids_by_source = {}
+        self.__index_factory = index_factory or FaissIndexFactory()
+        # RankFusion settings enable hybrid BM25 + vector retrieval; None keeps
+        # plain vector similarity.
+        self.__rank_fusion = rank_fusion
+        self.__keyword_index = BM25Index() if rank_fusion else None
 
     def create_retriever(self):
         print("Creating MultiDocumentRetriever")
-        embeddings = self.__embedding_model
-        doc_contents = self.__documents
+        self.__add_documents(self.__documents, self.__summary_docs)
+        return self.get_retriever()
+
+    def load_retriever(
+        self, vectorstore, docstore, doc_ids_by_source=None, keyword_index=None
+    ):
+        """
+        Rebuild the retriever from a previously persisted index.
+
+        Args:
+            vectorstore: FAISS vectorstore loaded from disk
+            docstore: Store of the raw documents, in memory or file-backed
+            doc_ids_by_source (dict): Mapping of document filename to its doc ids
+            keyword_index (dict): Dumped BM25 term counts of the same documents;
+                without them the keyword index is rebuilt from the docstores
+        """
+        print("Loading MultiDocumentRetriever from snapshot")
+        self.__docstore = docstore
+        self.__vectorstore = vectorstore
+        self.__index_factory.apply_search_params(vectorstore.index)
+        self.__doc_ids_by_source = dict(doc_ids_by_source or {})
+        if self.__keyword_index is not None:
+            doc_ids = list(vectorstore.index_to_docstore_id.values())
+            if keyword_index is not None and set(keyword_index) == set(doc_ids):
+                self.__keyword_index.load(keyword_index)
+                print(f"Loaded keyword index over {len(self.__keyword_index)} documents")
+            else:
+                summaries = self.__summaries_of(vectorstore.docstore, doc_ids)
+                for doc_id, summary, record in zip(
+                    doc_ids, summaries, docstore.mget(doc_ids)
+                ):
+                    self.__keyword_index.add(
+                        doc_id, self.__keyword_text(summary.page_content, record)
+                    )
+                print(f"Built keyword index over {len(self.__keyword_index)} documents")
+        return self.get_retriever()
+
+    def add_source(
+        self, source, text, tab, images, tab_summaries, image_summaries
+    ):
+        """
+        Index the elements extracted from one input document.
+
+        Args:
+            source (str): Filename of the input document
+            text (list): Text chunks from SectionChunker, or plain text elements
+            tab (list): Raw table elements
+            images (list): Image records from ImageFileStore.put()
+            tab_summaries (list): Summaries of the tables
+            image_summaries (list): Summaries of the images
+        """
+        self.add_sources(
+            {
+                source: {
+                    "text": text,
+                    "tab": tab,
+                    "images": images,
+                    "tab_summaries": tab_summaries,
+                    "image_summaries": image_summaries,
+                }
+            }
+        )
+
+    def add_sources(self, sources):
+        """
+        Index the elements extracted from several input documents at once.
+
+        Their summaries are embedded together, so an empty index is built and
+        trained once over all of them instead of over the first document.
+
+        Args:
+            sources (dict): Mapping of filename to the add_source() keyword arguments
+        """
+        self.delete_sources(list(sources))
+        records, summaries, counts = [], [], []
+        for source, elements in sources.items():
+            source_records = self.__to_records(
+                elements["text"], elements["tab"], elements["images"]
+            )
+            records.extend(source_records)
+            summaries.extend(
+                self.__texts_of(elements["text"])
+                + list(elements["tab_summaries"])
+                + list(elements["image_summaries"])
+            )
+            counts.append((source, len(source_records)))
+        doc_ids = self.__add_documents(records, summaries)
+        offset = 0
+        for source, count in counts:
+            self.__doc_ids_by_source[source] = doc_ids[offset : offset + count]
+            offset += count
+
+    def delete_source(self, source):
+        """
+        Remove every vector and docstore entry that came from one input document.
+
+        Args:
+            source (str): Filename of the input document
+        """
+        self.delete_sources([source])
+
+    def delete_sources(self, sources):
+        """
+        Remove every vector and docstore entry that came from several input
+        documents. An index without removal support is rebuilt once for all
+        of them.
+
+        Args:
+            sources (list): Filenames of the input documents
+        """
+        doc_ids = []
+        for source in sources:
+            source_ids = self.__doc_ids_by_source.pop(source, [])
+            if source_ids:
+                print(f"Removing {len(source_ids)} indexed elements of {source}")
+                doc_ids.extend(source_ids)
+        if not doc_ids:
+            return
+        if self.__index_factory.supports_removal:
+            self.__vectorstore.delete(doc_ids)
+        else:
+            self.__rebuild_vectorstore(exclude=set(doc_ids))
+        self.__docstore.mdelete(doc_ids)
+        if self.__keyword_index is not None:
+            self.__keyword_index.remove(doc_ids)
+
+    def get_retriever(self):
+        if self.__rank_fusion is not None:
+            return HybridRetriever(
+                vectorstore=self.vectorstore,
+                docstore=self.__docstore,
+                keyword_index=self.__keyword_index,
+                rank_fusion=self.__rank_fusion,
+                id_key=self.__id_key,
+            )
+        return MultiVectorRetriever(
+            vectorstore=self.vectorstore,
+            docstore=self.__docstore,
+            id_key=self.__id_key,
+        )
+
+    @staticmethod
+    def __to_records(text, tab, images):
+        return (
+            [t if isinstance(t, Document) else text_record(t, "text") for t in text]
+            + [text_record(t, "table") for t in tab]
+            + list(images)
+        )
+
+    @staticmethod
+    def __texts_of(text):
+        """Text chunks are embedded as they are, so they are their own summaries."""
+        return [t.page_content if isinstance(t, Document) else t for t in text]
+
+    @staticmethod
+    def __summaries_of(store, doc_ids):
+        """Summary documents of doc_ids, batched when the store is SQLite."""
+        if isinstance(store, SQLiteDocStore):
+            return store.mget(doc_ids)
+        return [store.search(doc_id) for doc_id in doc_ids]
+
+    @staticmethod
+    def __keyword_text(summary, record):
+        """Summary plus the raw text of a record; text chunks are their own summary."""
+        raw = record.page_content if isinstance(record, Document) else str(record)
+        return summary if raw == summary else f"{summary}\n{raw}"
+
+    def __add_documents(self, doc_contents, summaries):
         doc_ids = [str(uuid.uuid4()) for _ in doc_contents]
+        if not doc_ids:
+            return doc_ids
         summary_docs = [
             Document(page_content=s, metadata={self.__id_key: doc_ids[i]})
-            for i, s in enumerate(self.__summary_docs)
+            for i, s in enumerate(summaries)
         ]
-        
 
         self.__docstore.mset(list(zip(doc_ids, doc_contents)))
+        if self.__keyword_index is not None:
+            for doc_id, summary, record in zip(doc_ids, summaries, doc_contents):
+                self.__keyword_index.add(doc_id, self.__keyword_text(summary, record))
 
-        vectorstore = FAISS.from_documents(summary_docs, embedding=embeddings)
-        retriever_multi_vector_img = MultiVectorRetriever(
-            vectorstore=vectorstore,
-            docstore=self.__docstore,
-            id_key=self.__id_key,
+        # Vector ids mirror the docstore ids so a source can be deleted from both.
+        # An empty index is replaced so the configured index type gets trained,
+        # and one that outgrew its training is rebuilt over every vector.
+        if self.__vectorstore is None or self.__vectorstore.index.ntotal == 0:
+            self.__vectorstore = self.__index_factory.build(
+                summary_docs, doc_ids, self.__embedding_model
+            )
+        else:
+            self.__vectorstore.add_documents(summary_docs, ids=doc_ids)
+            if self.__index_factory.outgrown(self.__vectorstore.index):
+                print("---index outgrew its training, rebuilding---")
+                self.__rebuild_vectorstore(exclude=set())
+        return doc_ids
+
+    def __rebuild_vectorstore(self, exclude):
+        """Rebuild the index without the excluded ids (embeddings come from the cache)."""
+        keep_ids = [
+            doc_id
+            for doc_id in self.__vectorstore.index_to_docstore_id.values()
+            if doc_id not in exclude
+        ]
+        if not keep_ids:
+            self.__vectorstore = self.__index_factory.empty(
+                self.__embedding_model, self.__vectorstore.index.d
+            )
+            return
+        summary_docs = [
+            self.__vectorstore.docstore.search(doc_id) for doc_id in keep_ids
+        ]
+        self.__vectorstore = self.__index_factory.build(
+            summary_docs, keep_ids, self.__embedding_model
+        )
+
+    def benchmark_index(self, k=4, sample_size=100):
+        """Recall-vs-latency report of the configured index against exact search."""
+        return self.__index_factory.benchmark(
+            self.vectorstore, k=k, sample_size=sample_size
         )
-        return retriever_multi_vector_img
+
+    @property
+    def vectorstore(self):
+        # Without any documents indexed yet, an empty index stands in so the
+        # snapshot and the retrievers always get a vectorstore.
+        if self.__vectorstore is None:
+            self.__vectorstore = self.__index_factory.empty(self.__embedding_model)
+        return self.__vectorstore
+
+    @property
+    def docstore_items(self):
+        keys = list(self.__docstore.yield_keys())
+        return list(zip(keys, self.__docstore.mget(keys)))
+
+    @property
+    def keyword_index(self):
+        """Dumped BM25 term counts, None without hybrid search."""
+        return self.__keyword_index.dump() if self.__keyword_index is not None else None
+
+    @property
+    def doc_ids_by_source(self):
+        return self.__doc_ids_by_source
@@ -0,0 +1,212 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from urllib.request import pathname2url
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+from langchain_core.stores import BaseStore
+from PIL import Image
+from utils import hash_file
+
+IMAGE_MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+}
+
+
+def text_record(text, kind="text", metadata=None):
+    """
+    Typed docstore record for a text or table element.
+
+    Args:
+        text (str): Raw text or table content
+        kind (str): "text" or "table"
+        metadata (dict): Extra metadata such as chunk provenance
+    """
+    return Document(page_content=text, metadata={**(metadata or {}), "kind": kind})
+
+
+class ImageFileStore:
+    """
+    Keeps indexed images as content-addressed files instead of base64 strings
+    in the docstore.
+
+    The docstore holds only a small typed record (kind, path, mime, dims) per
+    image. The bytes are read when a chain actually needs them
+    (see utils.split_image_text_types).
+    """
+
+    def __init__(self, folder):
+        """
+        Args:
+            folder (str): Folder the image files are stored in
+        """
+        self.__folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def put(self, image_path):
+        """
+        Store an image and build its docstore record.
+
+        Args:
+            image_path (str): Path of the extracted image
+
+        Returns:
+            Document: Record with kind, path, mime, width and height metadata
+        """
+        ext = os.path.splitext(image_path)[1].lower()
+        stored_path = os.path.join(self.__folder, f"{hash_file(image_path)}{ext}")
+        # Identical images share one file.
+        if not os.path.exists(stored_path):
+            temp_path = f"{stored_path}.tmp"
+            shutil.copyfile(image_path, temp_path)
+            os.replace(temp_path, stored_path)
+
+        with Image.open(stored_path) as image:
+            width, height = image.size
+        return Document(
+            page_content="",
+            metadata={
+                "kind": "image",
+                "path": stored_path,
+                "mime": IMAGE_MIME_TYPES.get(ext, "application/octet-stream"),
+                "width": width,
+                "height": height,
+            },
+        )
+
+    def prune(self, records):
+        """
+        Delete stored images that no record references any more.
+
+        Args:
+            records (iterable): Docstore values still in use
+        """
+        referenced = {
+            os.path.abspath(record.metadata["path"])
+            for record in records
+            if isinstance(record, Document) and record.metadata.get("kind") == "image"
+        }
+        removed = 0
+        for filename in os.listdir(self.__folder):
+            path = os.path.abspath(os.path.join(self.__folder, filename))
+            if path not in referenced:
+                os.remove(path)
+                removed += 1
+        if removed:
+            print(f"Removed {removed} unreferenced images from {self.__folder}")
+
+
+class SQLiteDocStore(BaseStore[str, Document], Docstore):
+    """
+    File-backed store of Documents, one table of a SQLite file per store.
+
+    Serves both as the retriever's docstore (BaseStore) and as the FAISS
+    vectorstore's docstore (Docstore.search). Opened read-only, any number of
+    worker processes can serve from the same file and share its pages through
+    the OS page cache instead of each holding its own copy in memory.
+    """
+
+    def __init__(self, db_path, table="documents", read_only=False):
+        """
+        Args:
+            db_path (str): Path of the SQLite file
+            table (str): Table holding this store's documents
+            read_only (bool): Open the file read-only; it must already exist
+        """
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table}")
+        self.__db_path = db_path
+        self.__table = table
+        self.__read_only = read_only
+        self.__local = threading.local()
+        self.__connections = []
+        self.__lock = threading.Lock()
+        if not read_only:
+            folder = os.path.dirname(db_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            conn = self.__connection()
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(id TEXT PRIMARY KEY, record TEXT NOT NULL)"
+            )
+            conn.commit()
+
+    def __connection(self):
+        # One connection per thread; sqlite3 connections are not thread safe.
+        conn = getattr(self.__local, "conn", None)
+        if conn is None:
+            if self.__read_only:
+                uri = f"file:{pathname2url(os.path.abspath(self.__db_path))}?mode=ro"
+                conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self.__db_path, check_same_thread=False)
+            self.__local.conn = conn
+            with self.__lock:
+                self.__connections.append(conn)
+        return conn
+
+    def mget(self, keys):
+        found = {}
+        conn = self.__connection()
+        # Stay below SQLite's bound parameter limit.
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT id, record FROM {self.__table} WHERE id IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for doc_id, record in rows:
+                found[doc_id] = Document(**json.loads(record))
+        return [found.get(key) for key in keys]
+
+    def mset(self, key_value_pairs):
+        conn = self.__connection()
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {self.__table} (id, record) VALUES (?, ?)",
+            [
+                (
+                    key,
+                    json.dumps(
+                        {"page_content": doc.page_content, "metadata": doc.metadata}
+                    ),
+                )
+                for key, doc in key_value_pairs
+            ],
+        )
+        conn.commit()
+
+    def mdelete(self, keys):
+        conn = self.__connection()
+        conn.executemany(
+            f"DELETE FROM {self.__table} WHERE id = ?", [(key,) for key in keys]
+        )
+        conn.commit()
+
+    def yield_keys(self, prefix=None):
+        for (doc_id,) in self.__connection().execute(
+            f"SELECT id FROM {self.__table}"
+        ):
+            if prefix is None or doc_id.startswith(prefix):
+                yield doc_id
+
+    def search(self, search):
+        doc = self.mget([search])[0]
+        return doc if doc is not None else f"ID {search} not found."
+
+    def delete(self, ids):
+        self.mdelete(ids)
+
+    def close(self):
+        with self.__lock:
+            for conn in self.__connections:
+                conn.close()
+            self.__connections = []
+        self.__local = threading.local()
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from langchain_core.embeddings import Embeddings
+from langchain_core.rate_limiters import InMemoryRateLimiter
+
+
+class CachedBatchEmbeddings(Embeddings):
+    """
+    Embeddings wrapper used to build the FAISS index.
+
+    Texts are looked up in a persistent SQLite vector cache keyed by
+    (model, sha256(text)). Only unseen texts are sent to the wrapped model,
+    in batches of batch_size. Up to max_concurrency batches run at once,
+    paced by a token bucket limiter. Query embeddings are passed through
+    uncached.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        cache_path,
+        batch_size=100,
+        max_concurrency=4,
+        requests_per_second=2,
+    ):
+        """
+        Args:
+            embeddings: Embedding model to wrap
+            cache_path (str): Path of the SQLite vector cache
+            batch_size (int): Texts per embedding request
+            max_concurrency (int): Embedding requests running at once
+            requests_per_second (float): Request rate limit for the embedding API
+        """
+        self.__embeddings = embeddings
+        self.__model = str(getattr(embeddings, "model", type(embeddings).__name__))
+        self.__batch_size = batch_size
+        self.__max_concurrency = max(1, max_concurrency)
+        self.__rate_limiter = InMemoryRateLimiter(
+            requests_per_second=requests_per_second,
+            check_every_n_seconds=0.05,
+            max_bucket_size=self.__max_concurrency,
+        )
+        folder = os.path.dirname(cache_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self.__conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        vectors = self.__get_cached(hashes)
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in vectors:
+                missing[text_hash] = text
+
+        print(f"Embedding cache: {len(texts) - len(missing)}/{len(texts)} hits")
+        if missing:
+            started = time.perf_counter()
+            missing_hashes = list(missing)
+            batches = [
+                missing_hashes[start : start + self.__batch_size]
+                for start in range(0, len(missing_hashes), self.__batch_size)
+            ]
+            with ThreadPoolExecutor(max_workers=self.__max_concurrency) as executor:
+                for batch_vectors in executor.map(
+                    lambda batch: self.__embed_batch(batch, missing), batches
+                ):
+                    vectors.update(batch_vectors)
+            print(
+                f"Embedded {len(missing)} texts in {len(batches)} batches "
+                f"({time.perf_counter() - started:.1f}s)"
+            )
+        return [vectors[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.__embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.__embeddings.aembed_query(text)
+
+    def __embed_batch(self, batch_hashes, texts_by_hash):
+        self.__rate_limiter.acquire(blocking=True)
+        batch_vectors = self.__embeddings.embed_documents(
+            [texts_by_hash[text_hash] for text_hash in batch_hashes]
+        )
+        batch = dict(zip(batch_hashes, batch_vectors))
+        with self.__lock:
+            self.__conn.executemany(
+                "INSERT OR REPLACE INTO vectors (model, text_hash, vector) VALUES (?, ?, ?)",
+                [
+                    (self.__model, text_hash, array("f", vector).tobytes())
+                    for text_hash, vector in batch.items()
+                ],
+            )
+            self.__conn.commit()
+        return batch
+
+    def __get_cached(self, hashes):
+        unique_hashes = list(dict.fromkeys(hashes))
+        vectors = {}
+        with self.__lock:
+            # Stay below SQLite's bound parameter limit.
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.__conn.execute(
+                    "SELECT text_hash, vector FROM vectors "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.__model, *batch],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vectors[text_hash] = array("f", blob).tolist()
+        return vectors
@@ -0,0 +1,139 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Shared by all queries so the dense and keyword searches run side by side
+# without creating threads per request.
+_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-search")
+
+
+class RankFusion:
+    """
+    Settings for fusing dense and keyword results with Reciprocal Rank Fusion.
+
+    A document's score is the sum over both result lists of
+    weight / (rrf_k + rank). It is then multiplied by the weight of the
+    document's modality (text, table or image).
+    """
+
+    def __init__(
+        self,
+        k=4,
+        fetch_k=20,
+        rrf_k=60,
+        vector_weight=1.0,
+        keyword_weight=1.0,
+        modality_weights=None,
+    ):
+        """
+        Args:
+            k (int): Documents returned per query
+            fetch_k (int): Candidates fetched from each index before fusion
+            rrf_k (int): RRF rank constant, higher flattens the rank curve
+            vector_weight (float): Weight of the dense (FAISS) ranking
+            keyword_weight (float): Weight of the BM25 ranking
+            modality_weights (dict): Weight per record kind, 1.0 when missing
+        """
+        self.__k = k
+        self.__fetch_k = max(k, fetch_k)
+        self.__rrf_k = rrf_k
+        self.__vector_weight = vector_weight
+        self.__keyword_weight = keyword_weight
+        self.__modality_weights = dict(modality_weights or {})
+
+    @property
+    def fetch_k(self):
+        return self.__fetch_k
+
+    def fuse(self, dense_ids, keyword_ids):
+        """
+        Args:
+            dense_ids (list): Doc ids ranked by the vectorstore
+            keyword_ids (list): Doc ids ranked by BM25
+
+        Returns:
+            dict: Doc id to fused score, before modality weighting
+        """
+        scores = {}
+        for weight, ranked_ids in (
+            (self.__vector_weight, dense_ids),
+            (self.__keyword_weight, keyword_ids),
+        ):
+            for rank, doc_id in enumerate(ranked_ids, start=1):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight / (self.__rrf_k + rank)
+        return scores
+
+    def select(self, scores, records):
+        """
+        Apply modality weights and keep the top k records.
+
+        Args:
+            scores (dict): Fused scores from fuse()
+            records (dict): Doc id to docstore record
+
+        Returns:
+            list: Best records first
+        """
+        weighted = []
+        for doc_id, score in scores.items():
+            record = records.get(doc_id)
+            if record is None:
+                continue
+            kind = record.metadata.get("kind") if isinstance(record, Document) else None
+            weighted.append((score * self.__modality_weights.get(kind, 1.0), doc_id))
+        weighted.sort(reverse=True)
+        return [records[doc_id] for _, doc_id in weighted[: self.__k]]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves raw documents by querying the FAISS vectorstore (over summaries)
+    and a BM25 index (over summaries and raw text) in parallel, then fusing
+    both rankings with RankFusion.
+    """
+
+    vectorstore: Any
+    docstore: Any
+    keyword_index: Any
+    rank_fusion: Any
+    id_key: str = "doc_id"
+
+    def _get_relevant_documents(self, query: str, *, run_manager) -> List[Document]:
+        fetch_k = self.rank_fusion.fetch_k
+        dense = _SEARCH_EXECUTOR.submit(
+            self.vectorstore.similarity_search, query, k=fetch_k
+        )
+        keyword = _SEARCH_EXECUTOR.submit(self.keyword_index.search, query, fetch_k)
+        scores = self._fuse(dense.result(), keyword.result())
+        doc_ids = list(scores)
+        return self.rank_fusion.select(
+            scores, dict(zip(doc_ids, self.docstore.mget(doc_ids)))
+        )
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager
+    ) -> List[Document]:
+        fetch_k = self.rank_fusion.fetch_k
+        loop = asyncio.get_running_loop()
+        dense, keyword = await asyncio.gather(
+            self.vectorstore.asimilarity_search(query, k=fetch_k),
+            loop.run_in_executor(
+                _SEARCH_EXECUTOR, self.keyword_index.search, query, fetch_k
+            ),
+        )
+        scores = self._fuse(dense, keyword)
+        doc_ids = list(scores)
+        records = await self.docstore.amget(doc_ids)
+        return self.rank_fusion.select(scores, dict(zip(doc_ids, records)))
+
+    def _fuse(self, dense_docs, keyword_hits):
+        dense_ids = list(
+            dict.fromkeys(
+                doc.metadata[self.id_key]
+                for doc in dense_docs
+                if self.id_key in doc.metadata
+            )
+        )
+        return self.rank_fusion.fuse(dense_ids, [doc_id for doc_id, _ in keyword_hits])
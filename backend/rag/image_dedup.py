@@ -0,0 +1,110 @@
+from PIL import Image
+
+
+class ImageDeduplicator:
+    """
+    Groups near-duplicate images (repeated logos, footers, icons) by
+    perceptual difference hash and drops images too small to be informative.
+
+    Each group is represented by its first image in input order. Lookup uses
+    the pigeonhole principle: the hash is split into max_distance + 1 bands,
+    and two hashes within max_distance bits of each other must agree on at
+    least one band. Only images sharing a band are compared.
+    """
+
+    def __init__(self, hash_size=8, max_distance=5, min_pixels=64 * 64):
+        """
+        Args:
+            hash_size (int): Width/height of the difference hash grid (hash_size**2 bits)
+            max_distance (int): Maximum Hamming distance for two images to be grouped
+            min_pixels (int): Images with fewer pixels (width * height) are dropped
+        """
+        self.__hash_size = hash_size
+        self.__max_distance = max_distance
+        self.__min_pixels = min_pixels
+        hash_bits = hash_size * hash_size
+        band_count = max_distance + 1
+        band_width = -(-hash_bits // band_count)
+        self.__bands = [
+            (start, min(band_width, hash_bits - start))
+            for start in range(0, hash_bits, band_width)
+        ]
+
+    def deduplicate(self, image_paths):
+        """
+        Args:
+            image_paths (list): Paths of the extracted images
+
+        Returns:
+            dict: Path to the path of its group representative (itself for
+                representatives), or None for images that were dropped
+        """
+        representative_of = {}
+        hashes = {}
+        buckets = [{} for _ in self.__bands]
+        dropped = 0
+
+        for path in image_paths:
+            if path in representative_of:
+                continue
+            image_hash = self.__difference_hash(path)
+            if image_hash is None:
+                representative_of[path] = None
+                dropped += 1
+                continue
+
+            band_keys = [
+                (image_hash >> start) & ((1 << width) - 1)
+                for start, width in self.__bands
+            ]
+            representative = None
+            for bucket, key in zip(buckets, band_keys):
+                for candidate in bucket.get(key, []):
+                    if bin(image_hash ^ hashes[candidate]).count("1") <= self.__max_distance:
+                        representative = candidate
+                        break
+                if representative:
+                    break
+
+            if representative is None:
+                representative = path
+                hashes[path] = image_hash
+                for bucket, key in zip(buckets, band_keys):
+                    bucket.setdefault(key, []).append(path)
+            representative_of[path] = representative
+
+        groups = len(hashes)
+        print(
+            f"Image dedup: {len(representative_of)} images -> {groups} unique, "
+            f"{len(representative_of) - groups - dropped} near-duplicates, "
+            f"{dropped} too small"
+        )
+        return representative_of
+
+    def __difference_hash(self, path):
+        """Difference hash of an image, or None if it is too small or unreadable."""
+        try:
+            with Image.open(path) as image:
+                width, height = image.size
+                if width * height < self.__min_pixels:
+                    return None
+                pixels = list(
+                    image.convert("L")
+                    .resize(
+                        (self.__hash_size + 1, self.__hash_size),
+                        Image.Resampling.LANCZOS,
+                    )
+                    .getdata()
+                )
+        except (OSError, ValueError) as e:
+            print(f"Error hashing image {path}: {e}")
+            return None
+
+        row_width = self.__hash_size + 1
+        image_hash = 0
+        for row in range(self.__hash_size):
+            for col in range(self.__hash_size):
+                left = pixels[row * row_width + col]
+                right = pixels[row * row_width + col + 1]
+                image_hash = (image_hash << 1) | (left > right)
+        return image_hash
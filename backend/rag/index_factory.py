@@ -0,0 +1,255 @@
+import math
+import random
+import time
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+
+class FaissIndexFactory:
+    """
+    Builds the FAISS index behind the retriever's vectorstore.
+
+    Supported index types:
+        flat:  exact search (IndexFlatL2), the previous behaviour
+        ivf:   inverted lists over a trained coarse quantizer, tuned with nprobe
+        hnsw:  graph index, tuned with ef_search, no training needed
+        ivfpq: inverted lists with product-quantized codes for low memory
+
+    IVF variants need enough vectors to train on. Smaller corpora fall back
+    to flat, where exact search is cheap anyway. Vectors added later are
+    assigned to the cells trained on the first build; outgrown() tells when
+    the corpus has grown enough that the index should be rebuilt and
+    retrained.
+    """
+
+    def __init__(
+        self,
+        index_type="flat",
+        nlist=None,
+        nprobe=16,
+        hnsw_m=32,
+        ef_search=64,
+        pq_m=16,
+    ):
+        """
+        Args:
+            index_type (str): One of INDEX_TYPES
+            nlist (int): IVF cell count, None sizes it from the corpus (~4*sqrt(n))
+            nprobe (int): IVF cells visited per query
+            hnsw_m (int): HNSW neighbours per node
+            ef_search (int): HNSW candidate list size per query
+            pq_m (int): Sub-quantizers per vector for ivfpq
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(
+                f"Unsupported index type: {index_type}, expected one of {INDEX_TYPES}"
+            )
+        self.__index_type = index_type
+        self.__nlist = nlist
+        self.__nprobe = nprobe
+        self.__hnsw_m = hnsw_m
+        self.__ef_search = ef_search
+        self.__pq_m = pq_m
+
+    @property
+    def supports_removal(self):
+        """HNSW indexes cannot remove vectors and have to be rebuilt instead."""
+        return self.__index_type != "hnsw"
+
+    def build(self, documents, ids, embedding_model):
+        """
+        Embed documents and build a FAISS vectorstore with the configured index.
+
+        Args:
+            documents (list): Summary Documents to index
+            ids (list): Vectorstore ids of the documents
+            embedding_model: Embedding model for documents and queries
+
+        Returns:
+            FAISS: Vectorstore over the new index
+        """
+        texts = [doc.page_content for doc in documents]
+        vectors = np.asarray(embedding_model.embed_documents(texts), dtype="float32")
+        index = self.__create_index(vectors)
+        vectorstore = FAISS(
+            embedding_function=embedding_model,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+        vectorstore.add_embeddings(
+            list(zip(texts, vectors.tolist())),
+            metadatas=[doc.metadata for doc in documents],
+            ids=ids,
+        )
+        return vectorstore
+
+    def empty(self, embedding_model, dim=None):
+        """
+        Vectorstore over an empty index, for a corpus without documents.
+
+        Args:
+            embedding_model: Embedding model for documents and queries
+            dim (int): Vector size, None embeds a probe text to find it
+
+        Returns:
+            FAISS: Vectorstore that documents can be added to later
+        """
+        if dim is None:
+            dim = len(embedding_model.embed_query("dimension probe"))
+        # Untrained IVF variants cannot hold vectors, so they start out as Flat.
+        spec = self.__index_spec(0, dim)
+        print(f"Building empty FAISS index {spec}")
+        index = faiss.index_factory(dim, spec, faiss.METRIC_L2)
+        self.apply_search_params(index)
+        return FAISS(
+            embedding_function=embedding_model,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+
+    def outgrown(self, index):
+        """
+        Whether an IVF index should be rebuilt for the vectors it now holds:
+        it fell back to Flat but has enough vectors to train, or its cell
+        count was sized for under a quarter of them (nlist ~ 4*sqrt(n)).
+
+        Args:
+            index: FAISS index of the vectorstore
+
+        Returns:
+            bool: True when rebuilding would retrain it on enough vectors
+        """
+        if self.__index_type not in ("ivf", "ivfpq"):
+            return False
+        nlist = self.__ivf_nlist(index.ntotal)
+        if nlist is None:
+            return False
+        try:
+            trained_nlist = faiss.extract_index_ivf(index).nlist
+        except RuntimeError:
+            return True  # Flat fallback that can now be trained
+        return nlist >= 2 * trained_nlist
+
+    def apply_search_params(self, index):
+        """Set nprobe/efSearch on an index, e.g. after loading it from disk."""
+        if self.__index_type in ("ivf", "ivfpq"):
+            try:
+                faiss.extract_index_ivf(index).nprobe = self.__nprobe
+            except RuntimeError:
+                pass  # Fell back to flat at build time
+        elif self.__index_type == "hnsw" and hasattr(index, "hnsw"):
+            index.hnsw.efSearch = self.__ef_search
+
+    def __create_index(self, vectors):
+        count, dim = vectors.shape
+        spec = self.__index_spec(count, dim)
+        print(f"Building FAISS index {spec} over {count} vectors")
+        index = faiss.index_factory(dim, spec, faiss.METRIC_L2)
+        if not index.is_trained:
+            index.train(vectors)
+        self.apply_search_params(index)
+        return index
+
+    def __index_spec(self, count, dim):
+        if self.__index_type == "flat":
+            return "Flat"
+        if self.__index_type == "hnsw":
+            return f"HNSW{self.__hnsw_m}"
+
+        nlist = self.__ivf_nlist(count)
+        if nlist is None:
+            print(f"Too few vectors ({count}) to train {self.__index_type}, using Flat")
+            return "Flat"
+        if self.__index_type == "ivf":
+            return f"IVF{nlist},Flat"
+
+        pq_m = self.__pq_m
+        while dim % pq_m:
+            pq_m -= 1
+        return f"IVF{nlist},PQ{pq_m}"
+
+    def __ivf_nlist(self, count):
+        """IVF cell count trainable on count vectors, None when too few."""
+        nlist = self.__nlist or max(1, int(4 * math.sqrt(count)))
+        # FAISS wants ~39 training points per centroid, PQ codebooks 256 per sub-quantizer.
+        min_points = 39 * nlist if self.__index_type == "ivf" else max(39 * nlist, 256)
+        if count < min_points:
+            nlist = count // 39
+            if nlist < 1 or (self.__index_type == "ivfpq" and count < 256):
+                return None
+        return nlist
+
+    def benchmark(self, vectorstore, k=4, sample_size=100, seed=0):
+        """
+        Report recall@k and per-query latency of the vectorstore's index against
+        an exact flat index over the same vectors.
+
+        Stored summaries are re-embedded (served from the embedding cache) and a
+        random sample of them is used as queries.
+
+        Returns:
+            dict: Recall and latency percentiles (ms) of both indexes
+        """
+        embedding_model = vectorstore.embedding_function
+        ids = list(vectorstore.index_to_docstore_id.values())
+        if not ids:
+            return {}
+        texts = [vectorstore.docstore.search(doc_id).page_content for doc_id in ids]
+        vectors = np.asarray(embedding_model.embed_documents(texts), dtype="float32")
+
+        flat_index = faiss.IndexFlatL2(vectors.shape[1])
+        flat_index.add(vectors)
+        position_of = {doc_id: i for i, doc_id in enumerate(ids)}
+
+        rng = random.Random(seed)
+        sample = rng.sample(range(len(ids)), min(sample_size, len(ids)))
+        queries = vectors[sample]
+
+        def timed_search(index, translate):
+            latencies, results = [], []
+            for query in queries:
+                started = time.perf_counter()
+                _, labels = index.search(query.reshape(1, -1), k)
+                latencies.append((time.perf_counter() - started) * 1000)
+                results.append({translate(label) for label in labels[0] if label != -1})
+            return latencies, results
+
+        flat_latencies, exact = timed_search(flat_index, int)
+        ann_latencies, approx = timed_search(
+            vectorstore.index,
+            lambda label: position_of[vectorstore.index_to_docstore_id[int(label)]],
+        )
+        recall = sum(
+            len(a & e) / len(e) for a, e in zip(approx, exact) if e
+        ) / len(queries)
+
+        def percentiles(latencies):
+            return {
+                "p50": float(np.percentile(latencies, 50)),
+                "p99": float(np.percentile(latencies, 99)),
+            }
+
+        report = {
+            "index_type": self.__index_type,
+            "vectors": len(ids),
+            "queries": len(queries),
+            "k": k,
+            f"recall@{k}": recall,
+            "flat_latency_ms": percentiles(flat_latencies),
+            "index_latency_ms": percentiles(ann_latencies),
+        }
+        print(
+            f"Index benchmark ({self.__index_type}, {len(ids)} vectors): "
+            f"recall@{k}={recall:.3f}, "
+            f"p50/p99 {report['index_latency_ms']['p50']:.2f}/"
+            f"{report['index_latency_ms']['p99']:.2f} ms vs flat "
+            f"{report['flat_latency_ms']['p50']:.2f}/"
+            f"{report['flat_latency_ms']['p99']:.2f} ms"
+        )
+        return report
@@ -0,0 +1,239 @@
+import json
+import os
+import shutil
+import faiss
+from langchain.storage import InMemoryStore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from rag.document_store import SQLiteDocStore
+
+
+class IndexSnapshot:
+    """
+    Persists the built retriever (FAISS index, docstore contents, summaries) and
+    the generated SQL tool metadata on disk, together with the ingestion
+    manifest of the documents it was built from, so a restart over an unchanged
+    corpus skips extraction, summarization and embedding.
+
+    The raw FAISS index and a SQLite docstore are written so that serving
+    workers can open them read-only: documents are read from the file on
+    demand, letting all workers on a host share one copy through the OS page
+    cache. FAISS only memory-maps the inverted lists of IVF indexes (ivf,
+    ivfpq); Flat and HNSW indexes are still read into each worker's memory.
+    The BM25 term counts are saved too, so hybrid search workers restore the
+    keyword index instead of rebuilding it from the documents.
+    """
+
+    MANIFEST_FILE = "manifest.json"
+    INDEX_FILE = "index.faiss"
+    INDEX_IDS_FILE = "index_ids.json"
+    DOCSTORE_FILE = "docstore.sqlite"
+    SOURCES_FILE = "sources.json"
+    SUMMARIES_FILE = "summaries.json"
+    KEYWORD_INDEX_FILE = "keyword_index.json"
+    TOOL_METADATA_FILE = "tool_metadata.json"
+    # Files of the previous pickle based layout, removed on the next save.
+    LEGACY_FILES = ("faiss_index", "docstore.pkl")
+
+    def __init__(self, snapshot_path):
+        """
+        Initialize the snapshot location.
+
+        Args:
+            snapshot_path (str): Folder holding the persisted index bundle
+        """
+        self.__snapshot_path = snapshot_path
+
+    def has_index(self):
+        """
+        Returns:
+            bool: True if a complete index bundle has been saved
+        """
+        return all(
+            os.path.exists(os.path.join(self.__snapshot_path, name))
+            for name in (self.MANIFEST_FILE, self.INDEX_FILE, self.DOCSTORE_FILE)
+        )
+
+    def load_manifest(self):
+        """
+        Returns:
+            dict: Ingestion manifest entries of the saved index, empty if none
+        """
+        if not self.has_index():
+            return {}
+        manifest = self.__read_json(self.MANIFEST_FILE) or {}
+        return manifest.get("documents", {})
+
+    def save_index(
+        self,
+        manifest_entries,
+        vectorstore,
+        docstore_items,
+        doc_ids_by_source,
+        summaries,
+        keyword_index=None,
+    ):
+        """
+        Write the index bundle, replacing any previous one atomically.
+
+        Args:
+            manifest_entries (dict): Manifest of the documents the index was built from
+            vectorstore: FAISS vectorstore holding the summary embeddings
+            docstore_items (list): (doc_id, content) pairs of the raw documents
+            doc_ids_by_source (dict): Mapping of document filename to its doc ids
+            summaries (dict): Image and table summaries keyed by document filename
+            keyword_index (dict): Dumped BM25 term counts, None without hybrid search
+        """
+        print("---saving index snapshot---")
+        os.makedirs(self.__snapshot_path, exist_ok=True)
+        staging_path = os.path.join(self.__snapshot_path, ".staging")
+        if os.path.exists(staging_path):
+            shutil.rmtree(staging_path)
+        os.makedirs(staging_path)
+
+        faiss.write_index(vectorstore.index, os.path.join(staging_path, self.INDEX_FILE))
+        docstore_path = os.path.join(staging_path, self.DOCSTORE_FILE)
+        docstore = SQLiteDocStore(docstore_path)
+        docstore.mset(docstore_items)
+        docstore.close()
+        summary_store = SQLiteDocStore(docstore_path, table="summaries")
+        summary_store.mset(
+            [
+                (doc_id, vectorstore.docstore.search(doc_id))
+                for doc_id in vectorstore.index_to_docstore_id.values()
+            ]
+        )
+        summary_store.close()
+        json_files = [
+            (
+                self.INDEX_IDS_FILE,
+                {str(i): doc_id for i, doc_id in vectorstore.index_to_docstore_id.items()},
+            ),
+            (self.SOURCES_FILE, doc_ids_by_source),
+            (self.SUMMARIES_FILE, summaries),
+        ]
+        if keyword_index is not None:
+            json_files.append((self.KEYWORD_INDEX_FILE, keyword_index))
+        for name, data in json_files:
+            with open(os.path.join(staging_path, name), "w", encoding="utf-8") as file:
+                json.dump(data, file)
+
+        # Drop the manifest first so a crash mid-swap never leaves a manifest
+        # pointing at a half-written bundle.
+        manifest_path = os.path.join(self.__snapshot_path, self.MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        # A keyword index of an older bundle must not outlive it.
+        for name in self.LEGACY_FILES + (self.KEYWORD_INDEX_FILE,):
+            target = os.path.join(self.__snapshot_path, name)
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            elif os.path.exists(target):
+                os.remove(target)
+        # Replacing (not rewriting) the files keeps workers that still have the
+        # previous index mapped on a consistent copy until they reload.
+        for name in (self.INDEX_FILE, self.DOCSTORE_FILE) + tuple(
+            name for name, _ in json_files
+        ):
+            os.replace(
+                os.path.join(staging_path, name),
+                os.path.join(self.__snapshot_path, name),
+            )
+        shutil.rmtree(staging_path)
+
+        self.__write_json(self.MANIFEST_FILE, {"documents": manifest_entries})
+        print(f"Index snapshot saved to {self.__snapshot_path}")
+
+    def load_index(self, embedding_model, read_only=False):
+        """
+        Load the persisted index bundle.
+
+        Args:
+            embedding_model: Embedding model used to embed queries
+            read_only (bool): Serve straight from the files: the FAISS index is
+                opened with IO_FLAG_MMAP (which maps the inverted lists of IVF
+                indexes) and both docstores stay in SQLite. Such an index
+                cannot be updated. Otherwise everything is loaded into memory
+                so documents can be added and removed.
+
+        Returns:
+            tuple: (vectorstore, docstore, doc_ids_by_source, summaries)
+        """
+        print(f"---loading index snapshot{' (read-only)' if read_only else ''}---")
+        index_path = os.path.join(self.__snapshot_path, self.INDEX_FILE)
+        docstore_path = os.path.join(self.__snapshot_path, self.DOCSTORE_FILE)
+        summary_store = SQLiteDocStore(docstore_path, table="summaries", read_only=True)
+        docstore = SQLiteDocStore(docstore_path, read_only=True)
+        if read_only:
+            # FAISS maps the IVF inverted lists instead of reading them into
+            # process memory; other index types are read in full.
+            index = faiss.read_index(
+                index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+        else:
+            index = faiss.read_index(index_path)
+            summary_store = InMemoryDocstore(dict(self.__read_all(summary_store)))
+            docstore_items = self.__read_all(docstore)
+            docstore = InMemoryStore()
+            docstore.mset(docstore_items)
+
+        vectorstore = FAISS(
+            embedding_function=embedding_model,
+            index=index,
+            docstore=summary_store,
+            index_to_docstore_id={
+                int(i): doc_id
+                for i, doc_id in (self.__read_json(self.INDEX_IDS_FILE) or {}).items()
+            },
+        )
+        sources = self.__read_json(self.SOURCES_FILE) or {}
+        summaries = self.__read_json(self.SUMMARIES_FILE) or {}
+        return vectorstore, docstore, sources, summaries
+
+    def load_keyword_index(self):
+        """
+        Returns:
+            dict: Dumped BM25 term counts of the saved index, None if not saved
+        """
+        return self.__read_json(self.KEYWORD_INDEX_FILE)
+
+    @staticmethod
+    def __read_all(store):
+        """Read every document of a SQLiteDocStore and close it."""
+        keys = list(store.yield_keys())
+        items = list(zip(keys, store.mget(keys)))
+        store.close()
+        return items
+
+    def load_tool_metadata(self):
+        """
+        Returns:
+            dict: Mapping of database filename to its hash, tool name and description
+        """
+        return self.__read_json(self.TOOL_METADATA_FILE) or {}
+
+    def save_tool_metadata(self, tool_metadata):
+        """
+        Args:
+            tool_metadata (dict): Mapping of database filename to its hash, tool name and description
+        """
+        os.makedirs(self.__snapshot_path, exist_ok=True)
+        self.__write_json(self.TOOL_METADATA_FILE, tool_metadata)
+
+    def __read_json(self, name):
+        path = os.path.join(self.__snapshot_path, name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading {path}: {e}")
+            return None
+
+    def __write_json(self, name, data):
+        path = os.path.join(self.__snapshot_path, name)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=2)
+        os.replace(temp_path, path)
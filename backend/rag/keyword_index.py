@@ -0,0 +1,136 @@
+import heapq
+import math
+import re
+from collections import Counter
+
+# Keeps codes such as "AB-1234", "3.5" or "v2/rev1" together as one token.
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-/]\w+)*")
+HTML_TAG_PATTERN = re.compile(r"<[^>]+>")
+
+
+def tokenize(text):
+    """
+    Lowercased word tokens. Compound tokens (part numbers, figures) are kept
+    whole and also split into their parts, so both "ab-1234" and "1234" match.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(HTML_TAG_PATTERN.sub(" ", text).lower()):
+        tokens.append(token)
+        parts = [part for part in re.split(r"[.\-/_]", token) if part]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """
+    In-process inverted index scored with Okapi BM25.
+
+    Documents can be added and removed one source at a time, mirroring the
+    vectorstore, so exact terms (table codes, part numbers, figures) that
+    dense embeddings blur can still be matched. dump() and load() persist the
+    term counts, so a saved index is restored without re-reading or
+    re-tokenizing the documents.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        """
+        Args:
+            k1 (float): Term frequency saturation
+            b (float): Document length normalization
+        """
+        self.__k1 = k1
+        self.__b = b
+        self.__postings = {}
+        self.__doc_lengths = {}
+        self.__doc_terms = {}
+        self.__total_length = 0
+
+    def add(self, doc_id, text):
+        """
+        Args:
+            doc_id (str): Docstore id of the document
+            text (str): Text to index
+        """
+        self.remove([doc_id])
+        term_counts = Counter(tokenize(text))
+        for term, count in term_counts.items():
+            self.__postings.setdefault(term, {})[doc_id] = count
+        length = sum(term_counts.values())
+        self.__doc_lengths[doc_id] = length
+        self.__doc_terms[doc_id] = dict(term_counts)
+        self.__total_length += length
+
+    def dump(self):
+        """
+        Returns:
+            dict: Term counts of every document, JSON serializable
+        """
+        return dict(self.__doc_terms)
+
+    def load(self, documents):
+        """
+        Replace the index contents with previously dumped term counts.
+
+        Args:
+            documents (dict): Mapping of doc id to its term counts, as returned by dump()
+        """
+        self.__postings = {}
+        self.__doc_lengths = {}
+        self.__doc_terms = {}
+        self.__total_length = 0
+        for doc_id, term_counts in documents.items():
+            for term, count in term_counts.items():
+                self.__postings.setdefault(term, {})[doc_id] = count
+            length = sum(term_counts.values())
+            self.__doc_lengths[doc_id] = length
+            self.__doc_terms[doc_id] = dict(term_counts)
+            self.__total_length += length
+
+    def remove(self, doc_ids):
+        """
+        Args:
+            doc_ids (list): Docstore ids to drop from the index
+        """
+        for doc_id in doc_ids:
+            terms = self.__doc_terms.pop(doc_id, None)
+            if terms is None:
+                continue
+            self.__total_length -= self.__doc_lengths.pop(doc_id)
+            for term in terms:
+                postings = self.__postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self.__postings[term]
+
+    def search(self, query, k=20):
+        """
+        Args:
+            query (str): User query
+            k (int): Number of results
+
+        Returns:
+            list: (doc_id, score) pairs, best first
+        """
+        doc_count = len(self.__doc_lengths)
+        if not doc_count:
+            return []
+        average_length = self.__total_length / doc_count or 1
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.__postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.__k1 * (
+                    1 - self.__b + self.__b * self.__doc_lengths[doc_id] / average_length
+                )
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.__k1 + 1) / (
+                    tf + norm
+                )
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def __len__(self):
+        return len(self.__doc_lengths)
@@ -0,0 +1,120 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import HumanMessage
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+
+class ImageSummarizationEngine:
+    """
+    Summarizes images concurrently across several Gemini API keys.
+
+    One client is created per key and reused for every image. Each client has
+    its own token bucket limiter sized to the key's requests-per-minute quota.
+    Images are assigned to keys round-robin, so every key carries load instead
+    of only acting as a fallback. A request that fails on its assigned key is
+    retried on the remaining keys in order.
+    """
+
+    def __init__(
+        self,
+        api_keys,
+        model="gemini-2.0-flash",
+        requests_per_minute=15,
+        max_concurrency=None,
+    ):
+        """
+        Args:
+            api_keys (list): Gemini API keys, empty entries are ignored
+            model (str): Gemini model used for the summaries
+            requests_per_minute (int): Request quota of a single key
+            max_concurrency (int): Images summarized at once, defaults to 4 per key
+        """
+        self.__model = model
+        self.__api_keys = [key for key in api_keys if key]
+        if not self.__api_keys:
+            raise ValueError("At least one API key is required.")
+        self.__clients = [
+            ChatGoogleGenerativeAI(
+                model=model,
+                temperature=0,
+                google_api_key=api_key,
+                rate_limiter=InMemoryRateLimiter(
+                    requests_per_second=requests_per_minute / 60,
+                    check_every_n_seconds=0.1,
+                    max_bucket_size=1,
+                ),
+            )
+            for api_key in self.__api_keys
+        ]
+        self.__max_concurrency = max_concurrency or 4 * len(self.__clients)
+        self.__lock = threading.Lock()
+        self.__requests_per_key = [0] * len(self.__clients)
+        self.__failures_per_key = [0] * len(self.__clients)
+
+    @property
+    def model(self):
+        return self.__model
+
+    def summarize(self, prompt, images_base64):
+        """
+        Summarize images with the same prompt.
+
+        Args:
+            prompt (str): Instruction sent along with every image
+            images_base64 (list): Base64 encoded images
+
+        Returns:
+            list: Summaries in the same order as images_base64
+        """
+        if not images_base64:
+            return []
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.__max_concurrency) as executor:
+            summaries = list(
+                executor.map(
+                    lambda job: self.__summarize_image(prompt, *job),
+                    enumerate(images_base64),
+                )
+            )
+        self.__report(len(images_base64), time.perf_counter() - started)
+        return summaries
+
+    def __summarize_image(self, prompt, index, img_base64):
+        message = HumanMessage(
+            content=[
+                {"type": "text", "text": prompt},
+                {
+                    "type": "image_url",
+                    "image_url": {"url": f"data:image/jpeg;base64,{img_base64}"},
+                },
+            ]
+        )
+        key_count = len(self.__clients)
+        for attempt in range(key_count):
+            key_index = (index + attempt) % key_count
+            with self.__lock:
+                self.__requests_per_key[key_index] += 1
+            try:
+                return self.__clients[key_index].invoke([message]).content
+            except Exception as e:
+                with self.__lock:
+                    self.__failures_per_key[key_index] += 1
+                print(f"Error with API key #{key_index + 1}: {e}")
+
+        raise RuntimeError("All API keys failed.")
+
+    def __report(self, image_count, elapsed):
+        throughput = image_count / elapsed if elapsed > 0 else float("inf")
+        per_key = ", ".join(
+            f"key #{i + 1}: {requests} requests/{failures} failed"
+            for i, (requests, failures) in enumerate(
+                zip(self.__requests_per_key, self.__failures_per_key)
+            )
+        )
+        print(
+            f"Summarized {image_count} images in {elapsed:.1f}s "
+            f"({throughput:.2f} images/s) - {per_key}"
+        )
@@ -1,67 +1,104 @@
 import os
-from langchain_core.messages import HumanMessage
 from utils import encode_image
 from langchain_core.output_parsers import StrOutputParser
 from langchain.prompts import PromptTemplate
 from utils import IMAGE_EXTENSIONS
-from langchain_google_genai import ChatGoogleGenerativeAI
+from rag.summarization_engine import ImageSummarizationEngine
+
+
+def _model_identity(llm):
+    """Stable description of an LLM (including its fallbacks) for cache keys."""
+    runnable = getattr(llm, "runnable", None)
+    if runnable is not None:
+        fallbacks = getattr(llm, "fallbacks", [])
+        return "|".join(_model_identity(model) for model in [runnable, *fallbacks])
+    name = getattr(llm, "model", None) or getattr(llm, "model_name", None)
+    return f"{type(llm).__name__}:{name}"
 
 
 class DocumentSummarizer:
 
-    def __init__(self, llm, api_keys):
+    def __init__(self, llm, api_keys, requests_per_minute=15, max_concurrency=None, summary_cache=None):
         self.__llm = llm
-        self.__api_keys = api_keys
-
-    def __summarize_image(self, prompt, img_base64):
-        for api_key in self.__api_keys:
-            try:
-                chat = ChatGoogleGenerativeAI(
-                    model="gemini-2.0-flash",
-                    temperature=0,
-                    google_api_key=api_key
-                )
-                msg = chat.invoke(
-                    [
-                        HumanMessage(
-                            content=[
-                                {"type": "text", "text": prompt},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/jpeg;base64,{img_base64}"
-                                    },
-                                },
-                            ]
-                        )
-                    ]
-                )
-                return msg.content
-            except Exception as e:
-                print(f"Error with API key {api_key}: {e}")
-
-        raise RuntimeError("All API keys failed.")
+        self.__image_engine = ImageSummarizationEngine(
+            api_keys,
+            requests_per_minute=requests_per_minute,
+            max_concurrency=max_concurrency,
+        )
+        self.__summary_cache = summary_cache
+
+    def __summarize_with_cache(self, contents, prompt, model, summarize):
+        """
+        Summarize contents, only calling summarize() for the cache misses.
+
+        Args:
+            contents (list): Raw contents to summarize
+            prompt (str): Prompt used for the summaries
+            model (str): Identity of the summarizing model
+            summarize: Callable mapping a list of contents to their summaries
+        """
+        if self.__summary_cache is None:
+            return summarize(contents)
+
+        keys = [self.__summary_cache.make_key(c, prompt, model) for c in contents]
+        cached = self.__summary_cache.get_many(keys)
+        # Identical contents missing from the cache are summarized only once.
+        missing = {}
+        for key, content in zip(keys, contents):
+            if key not in cached and key not in missing:
+                missing[key] = content
+        print(f"Summary cache: {len(contents) - len(missing)}/{len(contents)} hits")
+
+        if missing:
+            new_summaries = dict(zip(missing, summarize(list(missing.values()))))
+            self.__summary_cache.set_many(new_summaries)
+            cached.update(new_summaries)
+        return [cached[key] for key in keys]
 
     def generate_img_summaries(self, image_folder):
         print("---Summarizing images---")
         image_folders = [f"{image_folder}/{f}" for f in os.listdir(image_folder)]
-        img_base64_list = []
-
-        image_summaries = []
+        image_paths = []
         for path in image_folders:
+            image_paths.extend(self.list_images(path))
+        return self.summarize_images(image_paths)
+
+    @staticmethod
+    def list_images(folder):
+        """Sorted paths of the supported images directly inside a folder."""
+        if not os.path.isdir(folder):
+            return []
+        return [
+            os.path.join(folder, img_file)
+            for img_file in sorted(os.listdir(folder))
+            if os.path.splitext(img_file)[1] in IMAGE_EXTENSIONS
+        ]
+
+    def summarize_images(self, image_paths):
+        """
+        Summarize the given images.
+
+        Args:
+            image_paths (list): Paths of the images to summarize
 
-            prompt = """You are an assistant tasked with summarizing images for retrieval. \
+        Returns:
+            tuple: (base64 encoded images, image summaries) in input order
+        """
+        img_base64_list = []
+
+        prompt = """You are an assistant tasked with summarizing images for retrieval. \
             These summaries will be embedded and used to retrieve the raw image. \
             Give a concise summary of the image that is well optimized for retrieval."""
 
-            for img_file in sorted(os.listdir(path)):
-                extension = os.path.splitext(img_file)[1]
-                if extension in IMAGE_EXTENSIONS:
-                    img_path = os.path.join(path, img_file)
-                    print(f"Summarizing image: {img_path}")
-                    base64_image = encode_image(img_path)
-                    img_base64_list.append(base64_image)
-                    image_summaries.append(self.__summarize_image(prompt, base64_image))
+        for img_path in image_paths:
+            print(f"Summarizing image: {img_path}")
+            img_base64_list.append(encode_image(img_path))
+        image_summaries = self.__summarize_with_cache(
+            img_base64_list,
+            prompt,
+            self.__image_engine.model,
+            lambda images: self.__image_engine.summarize(prompt, images),
+        )
         return img_base64_list, image_summaries
 
     def generate_tab_summaries(self, tab):
@@ -73,5 +110,12 @@ class DocumentSummarizer:
         summarize_chain = (
             {"element": lambda x: x} | prompt | self.__llm | StrOutputParser()
         )
-        table_summaries = summarize_chain.batch(tab, {"max_concurrency": 2})
+        if not tab:
+            return []
+        table_summaries = self.__summarize_with_cache(
+            tab,
+            prompt_text,
+            _model_identity(self.__llm),
+            lambda tables: summarize_chain.batch(tables, {"max_concurrency": 2}),
+        )
         return table_summaries
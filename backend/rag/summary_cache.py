@@ -0,0 +1,116 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class SummaryCache:
+    """
+    Persistent SQLite cache of LLM summaries.
+
+    Entries are keyed by a hash of the summarized content together with the
+    prompt and the model identity, so changing either invalidates the entry.
+    The table is bounded to max_entries; the least recently used entries are
+    evicted first.
+    """
+
+    def __init__(self, db_path, max_entries=100000):
+        """
+        Args:
+            db_path (str): Path of the SQLite file
+            max_entries (int): Maximum number of cached summaries
+        """
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.__max_entries = max_entries
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, summary TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.__conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_summaries_last_access "
+            "ON summaries (last_access)"
+        )
+        self.__conn.commit()
+
+    @staticmethod
+    def make_key(content, prompt, model):
+        """
+        Args:
+            content (str): Raw table HTML/text or base64 image data
+            prompt (str): Prompt used for the summary
+            model (str): Identity of the model producing the summary
+
+        Returns:
+            str: Cache key
+        """
+        digest = hashlib.sha256()
+        for part in (model, prompt, content):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_many(self, keys):
+        """
+        Look up cached summaries and mark them as recently used.
+
+        Args:
+            keys (list): Cache keys
+
+        Returns:
+            dict: Key to summary for the keys that are cached
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        with self.__lock:
+            # Stay below SQLite's bound parameter limit.
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.__conn.execute(
+                    f"SELECT key, summary FROM summaries WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.__conn.executemany(
+                    "UPDATE summaries SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self.__conn.commit()
+        return found
+
+    def set_many(self, items):
+        """
+        Store summaries and evict the least recently used entries over the limit.
+
+        Args:
+            items (dict): Key to summary
+        """
+        if not items:
+            return
+        now = time.time()
+        with self.__lock:
+            self.__conn.executemany(
+                "INSERT OR REPLACE INTO summaries (key, summary, last_access) "
+                "VALUES (?, ?, ?)",
+                [(key, summary, now) for key, summary in items.items()],
+            )
+            (count,) = self.__conn.execute("SELECT COUNT(*) FROM summaries").fetchone()
+            if count > self.__max_entries:
+                self.__conn.execute(
+                    "DELETE FROM summaries WHERE key IN ("
+                    "SELECT key FROM summaries ORDER BY last_access LIMIT ?)",
+                    (count - self.__max_entries,),
+                )
+            self.__conn.commit()
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
@@ -0,0 +1,152 @@
+import tiktoken
+from rag.document_store import text_record
+
+
+class SectionChunker:
+    """
+    Packs the text elements of a document into token-bounded chunks.
+
+    Title elements start a new section and are repeated at the top of every
+    chunk of that section. The body elements (NarrativeText, Text, ListItem)
+    are packed in document order into windows of at most max_tokens. Each new
+    window repeats the trailing elements of the previous one, up to
+    overlap_tokens. An element longer than a window is split on token
+    boundaries with the same overlap.
+
+    Each chunk is a "text" docstore record. Its metadata says where it came
+    from: source file, section title, pages and element ids.
+    """
+
+    def __init__(self, max_tokens=512, overlap_tokens=64, encoding_name="cl100k_base"):
+        """
+        Args:
+            max_tokens (int): Maximum tokens per chunk, section title included
+            overlap_tokens (int): Tokens of context carried into the next chunk
+            encoding_name (str): tiktoken encoding used to count tokens
+        """
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.__max_tokens = max_tokens
+        self.__overlap_tokens = overlap_tokens
+        self.__encoding = tiktoken.get_encoding(encoding_name)
+
+    def chunk(self, source, text_elements):
+        """
+        Args:
+            source (str): Filename of the input document
+            text_elements (list): Text elements in document order, dicts with
+                category, text, page and element_id
+
+        Returns:
+            list: Chunk Documents with kind, source, section, pages and element_ids metadata
+        """
+        chunks = []
+        for title, body in self.__sections(text_elements):
+            chunks.extend(self.__pack_section(source, title, body))
+        print(
+            f"Chunked {len(text_elements)} text elements of {source} into {len(chunks)} chunks"
+        )
+        return chunks
+
+    @staticmethod
+    def __sections(text_elements):
+        """Group elements into (title element or None, body elements) by Title boundaries."""
+        sections = []
+        title, body = None, []
+        for element in text_elements:
+            if not element["text"].strip():
+                continue
+            if element["category"] != "Title":
+                body.append(element)
+                continue
+            if body:
+                sections.append((title, body))
+                title, body = element, []
+            elif title is None:
+                title = element
+            else:
+                # Consecutive titles (e.g. chapter then section heading) head
+                # the same section.
+                title = {
+                    **title,
+                    "text": f"{title['text']} - {element['text']}",
+                    "element_id": None,
+                    "title_ids": title.get("title_ids", [title["element_id"]])
+                    + [element["element_id"]],
+                }
+        if body or title:
+            sections.append((title, body))
+        return sections
+
+    def __pack_section(self, source, title, body):
+        heading = title["text"] if title else ""
+        heading_tokens = len(self.__encoding.encode(heading + "\n\n")) if heading else 0
+        budget = self.__max_tokens - heading_tokens
+        if budget <= self.__overlap_tokens:
+            # Titles this long are most likely misclassified body text.
+            body = [title] + body
+            heading, heading_tokens, budget = "", 0, self.__max_tokens
+            title = None
+        if not body:
+            body = [title]
+            heading, title = "", None
+
+        # Units are (text, tokens, element); oversized elements become several units.
+        units = []
+        for element in body:
+            tokens = self.__encoding.encode(element["text"])
+            if len(tokens) <= budget:
+                units.append((element["text"], len(tokens), element))
+                continue
+            step = budget - self.__overlap_tokens
+            for start in range(0, len(tokens), step):
+                piece = tokens[start : start + budget]
+                units.append((self.__encoding.decode(piece), len(piece), element))
+                if start + budget >= len(tokens):
+                    break
+
+        chunks = []
+        window, window_tokens = [], 0
+        for unit in units:
+            if window and window_tokens + unit[1] > budget:
+                chunks.append(self.__make_chunk(source, heading, title, window))
+                window, window_tokens = self.__overlap(window, budget - unit[1])
+            window.append(unit)
+            window_tokens += unit[1]
+        if window:
+            chunks.append(self.__make_chunk(source, heading, title, window))
+        return chunks
+
+    def __overlap(self, window, room):
+        """Trailing units of a finished window to repeat at the start of the next."""
+        carried, tokens = [], 0
+        limit = min(self.__overlap_tokens, room)
+        for unit in reversed(window):
+            if tokens + unit[1] > limit:
+                break
+            carried.insert(0, unit)
+            tokens += unit[1]
+        return carried, tokens
+
+    @staticmethod
+    def __make_chunk(source, heading, title, window):
+        body_text = "\n".join(text for text, _, _ in window)
+        elements = [element for _, _, element in window]
+        if title:
+            elements = [title] + elements
+        element_ids = []
+        for element in elements:
+            for element_id in element.get("title_ids") or [element["element_id"]]:
+                if element_id and element_id not in element_ids:
+                    element_ids.append(element_id)
+        pages = sorted({element["page"] for element in elements if element["page"]})
+        return text_record(
+            f"{heading}\n\n{body_text}" if heading else body_text,
+            "text",
+            metadata={
+                "source": source,
+                "section": heading,
+                "pages": pages,
+                "element_ids": element_ids,
+            },
+        )
@@ -1,3 +1,4 @@
+import re
 from langchain_core.language_models import BaseLanguageModel
 from langchain_community.agent_toolkits import SQLDatabaseToolkit
 from langchain_community.tools.sql_database.tool import (
@@ -7,11 +8,17 @@ from langchain_community.tools.sql_database.tool import (
     QuerySQLDatabaseTool,
 )
 from pydantic import Field, ConfigDict
-from typing import Union, List
+from typing import Any, Union, List
 from langchain.tools.base import BaseTool
 from langchain_core.runnables.fallbacks import RunnableWithFallbacks
 from langchain_community.utilities.sql_database import SQLDatabase
 
+# Only results of statements that cannot modify the database are cached.
+READ_ONLY_SQL = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+WRITE_SQL = re.compile(
+    r"\b(insert|update|delete|replace|create|drop|alter|attach|pragma)\b", re.IGNORECASE
+)
+
 # Custom QuerySQLCheckerTool with fallback support
 class QuerySQLCheckerToolWithFallbacks(QuerySQLCheckerTool):
     """Use an LLM (with fallback support) to check if a query is correct."""
@@ -19,12 +26,50 @@ class QuerySQLCheckerToolWithFallbacks(QuerySQLCheckerTool):
     llm: Union[BaseLanguageModel, RunnableWithFallbacks]
 
 
+class CachedQuerySQLDatabaseTool(QuerySQLDatabaseTool):
+    """
+    QuerySQLDatabaseTool that reuses the result of a read-only query already
+    run against the same database version. Errors are not cached.
+    """
+
+    db_version: Any = Field(default=None, exclude=True)
+    result_cache: Any = Field(default=None, exclude=True)
+
+    def _run(self, query: str, run_manager=None):
+        if (
+            self.result_cache is None
+            or not READ_ONLY_SQL.match(query)
+            or WRITE_SQL.search(query)
+        ):
+            return super()._run(query, run_manager)
+        key = (" ".join(query.split()), self.db_version() if self.db_version else None)
+        result = self.result_cache.get(key)
+        if result is None:
+            result = super()._run(query, run_manager)
+            if not (isinstance(result, str) and result.startswith("Error:")):
+                self.result_cache.put(key, result)
+        else:
+            print("---reusing cached SQL result---")
+        return result
+
+
 # Custom SQLDatabaseToolkit with fallback support
 class CustomSQLDatabaseToolkit(SQLDatabaseToolkit):
-    """SQLDatabaseToolkit that supports LLMs with fallbacks."""
+    """
+    SQLDatabaseToolkit that supports LLMs with fallbacks.
+
+    With a result_cache (MemoCache) the query tool caches the results of
+    read-only SQL, keyed by the statement and db_version().
+
+    With include_schema_tools off, the list and info tools are left out; the
+    agent then works from the schema card in its system prompt.
+    """
 
     db: SQLDatabase = Field(exclude=True)
     llm: Union[BaseLanguageModel, RunnableWithFallbacks] = Field(exclude=True)
+    db_version: Any = Field(default=None, exclude=True)
+    result_cache: Any = Field(default=None, exclude=True)
+    include_schema_tools: bool = True
 
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
@@ -44,16 +89,23 @@ class CustomSQLDatabaseToolkit(SQLDatabaseToolkit):
         info_sql_database_tool = InfoSQLDatabaseTool(
             db=self.db, description=info_sql_database_tool_description
         )
+        schema_reference = (
+            f"use {info_sql_database_tool.name} to query the correct table fields."
+            if self.include_schema_tools
+            else "check the correct table fields in the database schema."
+        )
         query_sql_database_tool_description = (
             "Input to this tool is a detailed and correct SQL query, output is a "
             "result from the database. If the query is not correct, an error message "
             "will be returned. If an error is returned, rewrite the query, check the "
             "query, and try again. If you encounter an issue with Unknown column "
-            f"'xxxx' in 'field list', use {info_sql_database_tool.name} "
-            "to query the correct table fields."
+            f"'xxxx' in 'field list', {schema_reference}"
         )
-        query_sql_database_tool = QuerySQLDatabaseTool(
-            db=self.db, description=query_sql_database_tool_description
+        query_sql_database_tool = CachedQuerySQLDatabaseTool(
+            db=self.db,
+            description=query_sql_database_tool_description,
+            db_version=self.db_version,
+            result_cache=self.result_cache,
         )
         query_sql_checker_tool_description = (
             "Use this tool to double check if your query is correct before executing "
@@ -66,6 +118,8 @@ class CustomSQLDatabaseToolkit(SQLDatabaseToolkit):
             db=self.db, llm=self.llm, description=query_sql_checker_tool_description
         )
 
+        if not self.include_schema_tools:
+            return [query_sql_database_tool, query_sql_checker_tool]
         return [
             query_sql_database_tool,
             info_sql_database_tool,
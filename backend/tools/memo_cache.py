@@ -0,0 +1,56 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+def database_version(db_path):
+    """
+    Cheap identity of a SQLite database's contents: mtime and size of the file
+    and of its write-ahead log, so committed writes in either change it.
+    """
+    version = []
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(path)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
+
+class MemoCache:
+    """
+    Thread-safe in-process LRU map for memoized tool results.
+
+    Keys include the database version, so results of an older version are
+    never returned and age out of the LRU order.
+    """
+
+    def __init__(self, max_entries=256):
+        """
+        Args:
+            max_entries (int): Maximum memoized results, 0 disables the cache
+        """
+        self.__max_entries = max_entries
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns:
+            Memoized value, None when missing
+        """
+        with self.__lock:
+            value = self.__entries.get(key)
+            if value is not None:
+                self.__entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if not self.__max_entries:
+            return
+        with self.__lock:
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
@@ -0,0 +1,59 @@
+import os
+import sqlite3
+from urllib.request import pathname2url
+
+
+def build_schema_card(db_path, sample_rows=3, max_value_chars=100):
+    """
+    Describe a SQLite database for the SQL agent's system prompt: every table
+    with its row count, column names and types, and a few sample rows.
+
+    Args:
+        db_path (str): Path of the SQLite file
+        sample_rows (int): Rows shown per table
+        max_value_chars (int): Longer sample values are cut to this length
+
+    Returns:
+        str: Schema card text
+    """
+    # Database names come from document names, which may contain "?", "#" or "%".
+    conn = sqlite3.connect(
+        f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True
+    )
+    try:
+        tables = [
+            row[0]
+            for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' "
+                "AND name NOT LIKE 'sqlite_%' ORDER BY name"
+            )
+        ]
+        sections = []
+        for table in tables:
+            quoted = '"' + table.replace('"', '""') + '"'
+            columns = [
+                f"{name} {col_type or 'ANY'}"
+                for _, name, col_type, *_ in conn.execute(f"PRAGMA table_info({quoted})")
+            ]
+            (row_count,) = conn.execute(f"SELECT COUNT(*) FROM {quoted}").fetchone()
+            rows = conn.execute(f"SELECT * FROM {quoted} LIMIT ?", (sample_rows,)).fetchall()
+            lines = [
+                f'Table "{table}" ({row_count} rows)',
+                f"Columns: {', '.join(columns)}",
+            ]
+            if rows:
+                lines.append("Sample rows:")
+                lines.extend(
+                    "  " + repr(tuple(_truncate(value, max_value_chars) for value in row))
+                    for row in rows
+                )
+            sections.append("\n".join(lines))
+        return "\n\n".join(sections)
+    finally:
+        conn.close()
+
+
+def _truncate(value, max_chars):
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + "..."
+    return value
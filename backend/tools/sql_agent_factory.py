@@ -4,11 +4,22 @@ from langchain_community.utilities import SQLDatabase
 from langchain import hub
 from langchain_core.tools import tool
 from tools.sql_agent_tool import SQLAgentTool
+from tools.schema_card import build_schema_card
+from utils import hash_file
 
 class SQLAgentToolFactory:
     """Factory class for creating SQL Agent Tools from database files."""
 
-    def __init__(self, database_folder, llm, response_structure):
+    def __init__(
+        self,
+        database_folder,
+        llm,
+        response_structure,
+        tool_metadata=None,
+        memo_size=256,
+        schema_cards=True,
+        schema_tools=False,
+    ):
         """Initialize the factory.
 
         Args:
@@ -16,10 +27,19 @@ class SQLAgentToolFactory:
             llm: Primary language model
             backup_llm: Backup language model
             structured_response_llm: LLM configured for structured output
+            tool_metadata: Previously generated tool metadata keyed by database
+                filename, reused when the database file hash is unchanged
+            memo_size: Memoized answers and SQL results per tool, 0 disables them
+            schema_cards: Put each database's schema card in its agent's system prompt
+            schema_tools: Keep the list/info tools alongside the schema cards
         """
         self.database_folder = database_folder
         self.llm = llm
         self.response_structure = response_structure
+        self.tool_metadata = dict(tool_metadata or {})
+        self.memo_size = memo_size
+        self.schema_cards = schema_cards
+        self.schema_tools = schema_tools
         self.system_message = self._get_system_message()
 
     def _get_system_message(self):
@@ -34,22 +54,51 @@ class SQLAgentToolFactory:
             List of configured tool functions
         """
         tools = []
+        tool_metadata = {}
 
         for file in os.listdir(self.database_folder):
             if file.endswith(".db"):
                 db_path = os.path.join(self.database_folder, file)
                 uri = f"sqlite:///{db_path}"
                 db_instance = SQLDatabase.from_uri(uri)
+                db_hash = hash_file(db_path)
+                cached = self.tool_metadata.get(file)
+                reusable = cached and cached.get("hash") == db_hash
+
+                schema_card = None
+                if self.schema_cards:
+                    if reusable and cached.get("schema_card"):
+                        schema_card = cached["schema_card"]
+                    else:
+                        schema_card = build_schema_card(db_path)
 
                 sql_agent_tool = SQLAgentTool(
                     db_instance=db_instance,
                     llm=self.llm,
                     system_message=self.system_message,
+                    db_path=db_path,
+                    memo_size=self.memo_size,
+                    schema_card=schema_card,
+                    schema_tools=self.schema_tools,
                 )
 
-                tool = sql_agent_tool.generate_tool_metadata(
-                    self.llm.with_structured_output(self.response_structure)
-                )
+                if reusable:
+                    print(f"Reusing tool metadata for {file}")
+                    tool = sql_agent_tool.apply_tool_metadata(
+                        cached["tool_name"], cached["tool_description"]
+                    )
+                else:
+                    tool = sql_agent_tool.generate_tool_metadata(
+                        self.llm.with_structured_output(self.response_structure)
+                    )
+                tool_metadata[file] = {
+                    "hash": db_hash,
+                    "tool_name": tool.name,
+                    "tool_description": tool.description,
+                    "schema_card": schema_card,
+                }
                 tools.append(tool)
 
+        # Entries for databases that no longer exist are dropped here.
+        self.tool_metadata = tool_metadata
         return tools
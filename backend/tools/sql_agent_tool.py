@@ -1,37 +1,134 @@
 from tools.database_toolkits import CustomSQLDatabaseToolkit
+from langchain_core.messages import AIMessage, ToolMessage
 from langchain_core.tools import tool
 from langgraph.prebuilt import create_react_agent
+import re
+from tools.memo_cache import MemoCache, database_version
+from utils import normalize_question
+
+# Final message of create_react_agent when it runs out of steps.
+OUT_OF_STEPS_ANSWER = "Sorry, need more steps to process this request."
 
 
 class SQLAgentTool:
-    """Class representing a single SQL database agent tool."""
+    """Class representing a single SQL database agent tool.
+
+    Answers are memoized per (normalized question, database version), so a
+    repeated sub-question against an unchanged database file skips the ReAct
+    loop. Only answers of runs that executed a query, hit no tool error and
+    did not run out of steps are memoized. Below that, the query tool caches the rows of each executed
+    read-only SQL statement for the same database version.
+
+    Given a schema card, the card is part of the system prompt so the agent
+    can write its query without first listing the tables and fetching their
+    schema; the list and info tools are then only kept with schema_tools.
+    """
 
-    def __init__(self, db_instance, llm,system_message):
+    def __init__(
+        self,
+        db_instance,
+        llm,
+        system_message,
+        db_path=None,
+        memo_size=256,
+        schema_card=None,
+        schema_tools=True,
+    ):
         """Initialize a new SQL Agent Tool.
 
         Args:
             db_instance: SQLDatabase instance
             llm: large language model
             system_message: System prompt for the agent
+            db_path: Path of the SQLite file, its mtime and size version the caches
+            memo_size: Memoized answers and SQL results each, 0 disables them
+            schema_card: Schema card of the database (see build_schema_card)
+            schema_tools: Keep the list and info tools when a schema card is given
         """
         self.db_instance = db_instance
         self.llm = llm
-        self.toolkit = CustomSQLDatabaseToolkit(db=self.db_instance, llm=self.llm)
-        self.system_message = system_message
+        self.db_path = db_path
+        self.answer_memo = MemoCache(memo_size)
+        self.toolkit = CustomSQLDatabaseToolkit(
+            db=self.db_instance,
+            llm=self.llm,
+            db_version=self.database_version,
+            result_cache=MemoCache(memo_size),
+            include_schema_tools=schema_tools or not schema_card,
+        )
+        self.system_message = (
+            self.with_schema_card(system_message, schema_card)
+            if schema_card
+            else system_message
+        )
+        tools = self.toolkit.get_tools()
+        self.query_tool_name = tools[0].name
         self.agent_executor = create_react_agent(
             self.llm,
-            self.toolkit.get_tools(),
+            tools,
             prompt=self.system_message,
         )
         self.tool = self._create_tool()
 
+    @staticmethod
+    def with_schema_card(system_message, schema_card):
+        """System prompt that carries the schema instead of asking the agent to look it up."""
+        # The stock SQL agent prompt ends by requiring the list/schema lookups.
+        system_message = re.sub(
+            r"To start you should ALWAYS look at the tables.*", "", system_message, flags=re.DOTALL
+        ).rstrip()
+        return (
+            f"{system_message}\n\n"
+            "The tables of the database, their columns and some sample rows are "
+            "listed below. Write your query directly from this schema, without "
+            "listing the tables or fetching their schema first.\n\n"
+            f"{schema_card}"
+        )
+
+    def database_version(self):
+        """Version of the database contents, None when the file is unknown."""
+        return database_version(self.db_path) if self.db_path else None
+
+    def answered(self, messages):
+        """Whether an agent run ended in an answer worth memoizing.
+
+        Args:
+            messages: Messages of the agent run, the final answer last
+
+        Returns:
+            True when a query ran, no tool failed and the agent did not run out of steps
+        """
+        final = messages[-1]
+        if (
+            not isinstance(final, AIMessage)
+            or final.tool_calls
+            or not final.content
+            or final.content == OUT_OF_STEPS_ANSWER
+        ):
+            return False
+        tool_results = [message for message in messages if isinstance(message, ToolMessage)]
+        if any(
+            message.status == "error" or str(message.content).startswith("Error:")
+            for message in tool_results
+        ):
+            return False
+        return any(message.name == self.query_tool_name for message in tool_results)
+
     def _create_tool(self):
         """Create the tool function for this SQL agent."""
 
         @tool
         def _tool(query: str) -> str:
             """Tool placeholder - description will be set by formatter."""
-            response = self.agent_executor.invoke({"messages": query})["messages"][-1]
+            key = (normalize_question(query), self.database_version())
+            response = self.answer_memo.get(key)
+            if response is not None:
+                print(f"---reusing memoized answer of {self.tool.name}---")
+                return response
+            messages = self.agent_executor.invoke({"messages": query})["messages"]
+            response = messages[-1]
+            if self.answered(messages):
+                self.answer_memo.put(key, response)
             return response
 
         return _tool
@@ -74,11 +171,24 @@ class SQLAgentTool:
         response = None
         while response == None:
             response = structured_response_llm.invoke(formatted_prompt)
-        self.tool.name = response.tool_name
         extended_description = (
             response.tool_description
             + " The args should be in text form of user's plain text question instead of sql query. Pass query string to this tool "
         )
-        self.tool.description = extended_description
+
+        return self.apply_tool_metadata(response.tool_name, extended_description)
+
+    def apply_tool_metadata(self, tool_name, tool_description):
+        """Set previously generated metadata on the tool without calling the LLM.
+
+        Args:
+            tool_name: Name of the tool
+            tool_description: Full description of the tool
+
+        Returns:
+            Updated tool with name and description
+        """
+        self.tool.name = tool_name
+        self.tool.description = tool_description
 
         return self.tool
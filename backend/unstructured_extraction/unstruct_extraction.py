@@ -1,50 +1,234 @@
 import os
 import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import PyPDF2
 from unstructured.partition.pdf import partition_pdf
 
+ELEMENT_CATEGORIES = ["Title", "NarrativeText", "Text", "ListItem", "Image", "Table"]
+TEXT_CATEGORIES = ("Title", "NarrativeText", "Text", "ListItem")
+
+
+def _partition_pdf_chunk(pdf_path, image_dir, starting_page_number=1):
+    """
+    Partition one PDF (or one page range of it) and categorize its elements.
+
+    Runs inside worker processes, so it lives at module level and returns plain
+    strings that are cheap to pickle back to the parent.
+
+    Besides the per category lists, "TextElements" keeps the text elements in
+    document order as dicts with category, text, page and element_id, which
+    the chunker uses to rebuild sections.
+    """
+    raw_pdf_elements = partition_pdf(
+        filename=pdf_path,
+        strategy="hi_res",
+        extract_images_in_pdf=True,
+        extract_image_block_types=["Image", "Table"],
+        extract_image_block_to_payload=False,
+        extract_image_block_output_dir=image_dir,
+        starting_page_number=starting_page_number,
+    )
+
+    elements = {category: [] for category in ELEMENT_CATEGORIES}
+    elements["TextElements"] = []
+    for element in raw_pdf_elements:
+        if "unstructured.documents.elements.Title" in str(type(element)):
+            elements["Title"].append(str(element))
+        elif "unstructured.documents.elements.NarrativeText" in str(type(element)):
+            elements["NarrativeText"].append(str(element))
+        elif "unstructured.documents.elements.Text" in str(type(element)):
+            elements["Text"].append(str(element))
+        elif "unstructured.documents.elements.ListItem" in str(type(element)):
+            elements["ListItem"].append(str(element))
+        elif "unstructured.documents.elements.Image" in str(type(element)):
+            elements["Image"].append(str(element))
+        elif "unstructured.documents.elements.Table" in str(type(element)):
+            elements["Table"].append(str(element))
+        else:
+            continue
+
+        category = type(element).__name__
+        if category in TEXT_CATEGORIES:
+            elements["TextElements"].append(
+                {
+                    "category": category,
+                    "text": str(element),
+                    "page": getattr(element.metadata, "page_number", None),
+                    "element_id": element.id,
+                }
+            )
+    return elements
+
+
 class UnstructuredDocumentExtraction:
-    def __init__(self,input_path,output_path):
+    def __init__(self,input_path,output_path,max_workers=1,pages_per_chunk=None):
+        """
+        Args:
+            input_path (str): Folder containing the PDFs
+            output_path (str): Folder that receives the pdf-{index} image folders
+            max_workers (int): Number of processes partitioning in parallel, 1 runs inline
+            pages_per_chunk (int): Split PDFs longer than this into page ranges that
+                are partitioned independently, None partitions whole files
+        """
         self.__Title = []
         self.__NarrativeText = []
         self.__Text = []
         self.__ListItem = []
         self.__img = []
         self.__tab = []
+        self.__elements_by_file = {}
         self.__output_path = output_path
         self.__input_path = input_path
+        self.__max_workers = max(1, max_workers or 1)
+        self.__pages_per_chunk = pages_per_chunk
 
-    def extract_content_from_folder(self):
+    def extract_content_from_folder(self, files=None, image_slots=None):
+        """
+        Partition PDFs and collect their elements by category.
+
+        Args:
+            files (list): PDF filenames to process, defaults to every PDF in the input folder
+            image_slots (dict): Filename to the index used for its pdf-{index} image
+                folder, defaults to the file's position in the list
+        """
         print("---Extracting content from folder---")
 
-        pdf_files = [f for f in os.listdir(self.__input_path) if f.endswith("pdf")]
-        index = 0
+        if files is None:
+            files = os.listdir(self.__input_path)
+        pdf_files = [f for f in files if f.endswith("pdf")]
+        if not pdf_files:
+            return
+
+        chunk_dir = tempfile.mkdtemp(prefix="pdf-chunks-")
+        try:
+            # jobs[i] = (file, pdf_path, image_dir, starting_page_number)
+            jobs = []
+            image_dirs = {}
+            index = 0
+            for file in pdf_files:
+                index += 1
+                pdf_path = os.path.join(self.__input_path, file)
+                image_dir = self.image_dir(image_slots[file] if image_slots else index)
+                image_dirs[file] = image_dir
+                # Images from a previous extraction of this file would otherwise linger.
+                if os.path.exists(image_dir):
+                    shutil.rmtree(image_dir)
+
+                chunks = self.__split_pdf(pdf_path, chunk_dir)
+                if len(chunks) == 1:
+                    jobs.append((file, pdf_path, image_dir, 1))
+                    continue
+                for chunk_index, (chunk_path, starting_page) in enumerate(chunks):
+                    jobs.append(
+                        (
+                            file,
+                            chunk_path,
+                            os.path.join(image_dir, f"part-{chunk_index:04d}"),
+                            starting_page,
+                        )
+                    )
+
+            results = self.__run_jobs(jobs)
+        finally:
+            shutil.rmtree(chunk_dir, ignore_errors=True)
+
+        # Merge in submission order so the element lists are identical to a
+        # serial run regardless of which worker finished first.
         for file in pdf_files:
-            index += 1
-            pdf_path = os.path.join(self.__input_path, file)
-
-            raw_pdf_elements = partition_pdf(
-                filename=pdf_path,
-                strategy="hi_res",
-                extract_images_in_pdf=True,
-                extract_image_block_types=["Image", "Table"],
-                extract_image_block_to_payload=False,
-                extract_image_block_output_dir=f"{self.__output_path}/pdf-{index}",
-            )
+            elements = {category: [] for category in ELEMENT_CATEGORIES}
+            elements["TextElements"] = []
+            for (job_file, _, _, _), chunk_elements in zip(jobs, results):
+                if job_file != file:
+                    continue
+                for category in ELEMENT_CATEGORIES:
+                    elements[category].extend(chunk_elements[category])
+                elements["TextElements"].extend(chunk_elements["TextElements"])
+            self.__flatten_chunk_images(image_dirs[file])
+
+            self.__elements_by_file[file] = elements
+            self.__Title.extend(elements["Title"])
+            self.__NarrativeText.extend(elements["NarrativeText"])
+            self.__Text.extend(elements["Text"])
+            self.__ListItem.extend(elements["ListItem"])
+            self.__img.extend(elements["Image"])
+            self.__tab.extend(elements["Table"])
+
+    def __run_jobs(self, jobs):
+        if self.__max_workers == 1 or len(jobs) == 1:
+            return [_partition_pdf_chunk(*job[1:]) for job in jobs]
+
+        workers = min(self.__max_workers, len(jobs))
+        print(f"Partitioning {len(jobs)} chunks with {workers} worker processes")
+        # Submit the largest inputs first so a long PDF does not start last and
+        # leave the other workers idle at the end.
+        order = sorted(
+            range(len(jobs)), key=lambda i: os.path.getsize(jobs[i][1]), reverse=True
+        )
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {i: executor.submit(_partition_pdf_chunk, *jobs[i][1:]) for i in order}
+            return [futures[i].result() for i in range(len(jobs))]
+
+    def __split_pdf(self, pdf_path, chunk_dir):
+        """
+        Split a PDF into page-range files when it is longer than pages_per_chunk.
+
+        Returns:
+            list: (chunk_path, starting_page_number) tuples, a single entry for
+                the original file when no split is needed
+        """
+        if not self.__pages_per_chunk:
+            return [(pdf_path, 1)]
+        try:
+            reader = PyPDF2.PdfReader(pdf_path)
+            total_pages = len(reader.pages)
+        except Exception as e:
+            print(f"Error reading {pdf_path}, partitioning it whole: {e}")
+            return [(pdf_path, 1)]
+        if total_pages <= self.__pages_per_chunk:
+            return [(pdf_path, 1)]
+
+        chunks = []
+        name = os.path.splitext(os.path.basename(pdf_path))[0]
+        for start in range(0, total_pages, self.__pages_per_chunk):
+            writer = PyPDF2.PdfWriter()
+            for page in reader.pages[start : start + self.__pages_per_chunk]:
+                writer.add_page(page)
+            chunk_path = os.path.join(chunk_dir, f"{name}-{start + 1}.pdf")
+            with open(chunk_path, "wb") as file:
+                writer.write(file)
+            chunks.append((chunk_path, start + 1))
+        return chunks
+
+    def __flatten_chunk_images(self, image_dir):
+        """
+        Move images written per page range into the document's pdf-{index} folder.
+
+        The chunk number prefix keeps names unique and keeps the sorted order
+        of the images in page order.
+        """
+        if not os.path.isdir(image_dir):
+            return
+        for part in sorted(os.listdir(image_dir)):
+            part_dir = os.path.join(image_dir, part)
+            if not (part.startswith("part-") and os.path.isdir(part_dir)):
+                continue
+            chunk_number = part[len("part-") :]
+            for img_file in os.listdir(part_dir):
+                os.replace(
+                    os.path.join(part_dir, img_file),
+                    os.path.join(image_dir, f"{chunk_number}-{img_file}"),
+                )
+            os.rmdir(part_dir)
+
+    def image_dir(self, index):
+        """Folder that partition_pdf writes the images of the pdf-{index} document to."""
+        return f"{self.__output_path}/pdf-{index}"
+
+    @property
+    def elements_by_file(self):
+        return self.__elements_by_file
 
-            for element in raw_pdf_elements:
-                if "unstructured.documents.elements.Title" in str(type(element)):
-                    self.__Title.append(str(element))
-                elif "unstructured.documents.elements.NarrativeText" in str(type(element)):
-                    self.__NarrativeText.append(str(element))
-                elif "unstructured.documents.elements.Text" in str(type(element)):
-                    self.__Text.append(str(element))
-                elif "unstructured.documents.elements.ListItem" in str(type(element)):
-                    self.__ListItem.append(str(element))
-                elif "unstructured.documents.elements.Image" in str(type(element)):
-                    self.__img.append(str(element))
-                elif "unstructured.documents.elements.Table" in str(type(element)):
-                    self.__tab.append(str(element))
-    
     
     @property
     def Title(self):
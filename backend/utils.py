@@ -1,4 +1,5 @@
 import base64
+import hashlib
 import os
 import re
 from langchain_core.documents import Document
@@ -15,6 +16,20 @@ def encode_image(image_path):
         return base64.b64encode(image_file.read()).decode("utf-8")
 
 
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """Return the sha256 hex digest of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace and drop trailing punctuation, for cache keys"""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?.!").strip().lower()
+
+
 def looks_like_base64(sb):
     """Check if the string looks like base64"""
     return re.match("^[A-Za-z0-9+/]+[=]{0,2}$", sb) is not None
@@ -43,12 +58,22 @@ def is_image_data(b64data):
 def split_image_text_types(docs):
     """
     Split base64-encoded images and texts
+
+    Typed records (metadata "kind") are dispatched on their kind and only image
+    records read their file; untyped strings are sniffed for base64 image data.
     """
     b64_images = []
     texts = []
     for doc in docs:
         # Check if the document is of type Document and extract page_content if so
         if isinstance(doc, Document):
+            kind = doc.metadata.get("kind")
+            if kind == "image":
+                b64_images.append(encode_image(doc.metadata["path"]))
+                continue
+            if kind is not None:
+                texts.append(doc.page_content)
+                continue
             doc = doc.page_content
         if looks_like_base64(doc) and is_image_data(doc):
             b64_images.append(doc)
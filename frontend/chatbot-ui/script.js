@@ -1,4 +1,11 @@
 const messages = [];
+// Identifies this browser's conversation so the server keeps its history apart.
+const sessionId =
+  localStorage.getItem("chatSessionId") ||
+  (crypto.randomUUID
+    ? crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(16).slice(2)}`);
+localStorage.setItem("chatSessionId", sessionId);
 const inputElement = document.querySelector(".message-input");
 
 inputElement.addEventListener("keydown", (event) => {
@@ -7,7 +14,7 @@ inputElement.addEventListener("keydown", (event) => {
   }
 });
 
-function renderChatArea(shouldRenderLoading) {
+function renderChatArea(shouldRenderLoading, progressText = "") {
   let final_html = "";
   messages.forEach((msg) => {
     let html = "";
@@ -46,7 +53,7 @@ function renderChatArea(shouldRenderLoading) {
 
   const chatContainer = document.querySelector(".messages-container");
   chatContainer.innerHTML = final_html;
-  if (shouldRenderLoading) renderLoadingAnimation(chatContainer);
+  if (shouldRenderLoading) renderLoadingAnimation(chatContainer, progressText);
   else {
     let container = document.querySelector(".chat-area");
     container.scrollTop = container.scrollHeight;
@@ -59,7 +66,7 @@ sendButton.addEventListener("click", () => {
   sendMessage();
 });
 
-function renderLoadingAnimation(container) {
+function renderLoadingAnimation(container, progressText = "") {
   const loadingAnimation = `
         <div class="message loading-message">
         <div class="message-avatar claude-avatar">C</div>
@@ -70,6 +77,11 @@ function renderLoadingAnimation(container) {
             <div class="dot"></div>
             <div class="dot"></div>
           </div>
+          ${
+            progressText === ""
+              ? ""
+              : `<span class="loading-status">${progressText}</span>`
+          }
         </div>
         </div>
       </div>
@@ -91,6 +103,47 @@ function sendMessage() {
   getChatbotResponse(inputMsg);
 }
 
+// Reads a LangServe server-sent event stream and calls onEvent with the
+// payload of every "data" event.
+async function readEventStream(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer = (buffer + decoder.decode(value, { stream: true })).replace(
+      /\r\n/g,
+      "\n"
+    );
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let eventType = "message";
+      const dataLines = [];
+      frame.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) eventType = line.slice(6).trim();
+        else if (line.startsWith("data:")) dataLines.push(line.slice(5).trim());
+      });
+      if (eventType === "error") throw new Error(dataLines.join("\n"));
+      if (eventType === "data" && dataLines.length > 0) {
+        onEvent(JSON.parse(dataLines.join("\n")));
+      }
+    }
+  }
+}
+
+function chunkText(content) {
+  if (typeof content === "string") return content;
+  if (Array.isArray(content)) {
+    return content
+      .map((part) => (typeof part === "string" ? part : part.text || ""))
+      .join("");
+  }
+  return "";
+}
+
 async function getChatbotResponse(query) {
   const data = {
     input: {
@@ -108,34 +161,63 @@ async function getChatbotResponse(query) {
     config: {},
     kwargs: {},
   };
-  let responseData;
-  let imageData;
+  // Look up the images while the answer is streaming.
+  const imagesPromise = fetch(
+    `http://localhost:8000/query_image?query=${encodeURIComponent(query)}`,
+    {
+      method: "GET",
+      headers: { "Content-Type": "text/plain" },
+    }
+  )
+    .then((response) => response.json())
+    .then((imageData) => imageData.images || [])
+    .catch((error) => {
+      console.log(error);
+      return [];
+    });
+
+  const aiMessage = { type: "ai", content: "", images: [] };
+  let finalAnswer = "";
   try {
-    const response = await fetch("http://localhost:8000/agent/invoke", {
+    const response = await fetch("http://localhost:8000/agent/stream_events", {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        "X-Session-Id": sessionId,
       },
       body: JSON.stringify(data),
     });
-    const imageResponse = await fetch(
-      `http://localhost:8000/query_image?query=${query}`,
-      {
-        method: "GET",
-        headers: { "Content-Type": "text/plain" },
+    await readEventStream(response, (event) => {
+      if (event.event === "on_custom_event" && event.name === "progress") {
+        // Progress only shows until the first answer token arrives.
+        if (!messages.includes(aiMessage)) {
+          renderChatArea(true, event.data.message);
+        }
+      } else if (
+        event.event === "on_chat_model_stream" &&
+        (event.tags || []).includes("final_answer")
+      ) {
+        if (!messages.includes(aiMessage)) messages.push(aiMessage);
+        aiMessage.content += chunkText(event.data.chunk.content);
+        renderChatArea(false);
+      } else if (
+        event.event === "on_chain_end" &&
+        event.data &&
+        event.data.output &&
+        event.data.output.answer
+      ) {
+        finalAnswer = chunkText(event.data.output.answer.content);
       }
-    );
-    responseData = await response.json();
-    imageData = await imageResponse.json();
-    document.querySelector(".loading-message").remove();
+    });
   } catch (error) {
     console.log(error);
   }
-  messages.push({
-    type: "ai",
-    content: responseData.output.answer.content,
-    images: imageData.images,
-  });
+  // Models that do not stream only deliver the answer with the graph output.
+  if (aiMessage.content === "") aiMessage.content = finalAnswer;
+  if (!messages.includes(aiMessage)) messages.push(aiMessage);
+  renderChatArea(false);
+
+  aiMessage.images = await imagesPromise;
   renderChatArea(false);
 }
 